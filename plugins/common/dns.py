@@ -0,0 +1,254 @@
+import asyncio
+import socket
+import struct
+import time
+import ipaddress
+import os
+
+# ===== DNS RESOLUTION HELPERS =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+# It has no OctoPwn dependencies, so it can be tested on its own against a stub DNS server.
+#
+# - DNSCache: TTL cache with a negative cache, shared between plugins via DNSCache.get_shared(octopwnobj)
+# - DNSUDPClient: minimal UDP DNS client for A and PTR queries
+# - BulkResolver: concurrent lookups with a bounded number of queries in flight, using the cache
+
+
+# TTL cache for DNS answers, with a separate negative cache for failed lookups.
+class DNSCache:
+    def __init__(self):
+        # (qtype, name) -> (expires_at, value)
+        self.entries = {}
+        # (qtype, name) -> expires_at
+        self.negative = {}
+        self.hits = 0
+        self.misses = 0
+
+    # the cache is attached to the octopwn object so all plugins share the same instance
+    @staticmethod
+    def get_shared(octopwnobj):
+        cache = getattr(octopwnobj, 'dnscache', None)
+        if cache is None:
+            cache = DNSCache()
+            setattr(octopwnobj, 'dnscache', cache)
+        return cache
+
+    # returns (found, value). value is None for cached failures
+    def get(self, qtype:str, name:str):
+        key = (qtype, name.lower())
+        now = time.monotonic()
+        if key in self.entries:
+            expires_at, value = self.entries[key]
+            if expires_at > now:
+                self.hits += 1
+                return True, value
+            del self.entries[key]
+        if key in self.negative:
+            if self.negative[key] > now:
+                self.hits += 1
+                return True, None
+            del self.negative[key]
+        self.misses += 1
+        return False, None
+
+    # ttl is the cache time of the answer, or of the failure if value is None
+    def put(self, qtype:str, name:str, value, ttl:int):
+        key = (qtype, name.lower())
+        if value is None:
+            self.negative[key] = time.monotonic() + ttl
+            return
+        self.entries[key] = (time.monotonic() + ttl, value)
+
+    def clear(self):
+        self.entries = {}
+        self.negative = {}
+
+    def to_dict(self):
+        return {
+            'entries' : len(self.entries),
+            'negative' : len(self.negative),
+            'hits' : self.hits,
+            'misses' : self.misses,
+        }
+
+
+class DNSClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, txid:int, answer_fut:asyncio.Future):
+        self.txid = txid
+        self.answer_fut = answer_fut
+
+    def datagram_received(self, data, addr):
+        if len(data) >= 2 and struct.unpack('!H', data[:2])[0] == self.txid and self.answer_fut.done() is False:
+            self.answer_fut.set_result(data)
+
+    def error_received(self, exc):
+        if self.answer_fut.done() is False:
+            self.answer_fut.set_exception(exc)
+
+
+# Minimal UDP DNS client supporting A and PTR queries.
+class DNSUDPClient:
+    QTYPES = {'A' : 1, 'PTR' : 12}
+
+    def __init__(self, ip:str, port:int = 53, timeout:int = 2):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+
+    @staticmethod
+    def from_string(nameserver:str, timeout:int = 2):
+        nameserver = nameserver.strip()
+        if nameserver.startswith('[') is True:
+            # [ipv6]:port
+            ip, _, port = nameserver[1:].partition(']')
+            return DNSUDPClient(ip, int(port[1:]) if port.startswith(':') else 53, timeout)
+        if nameserver.count(':') == 1:
+            ip, port = nameserver.split(':')
+            return DNSUDPClient(ip, int(port), timeout)
+        return DNSUDPClient(nameserver, 53, timeout)
+
+    @staticmethod
+    def encode_name(name:str) -> bytes:
+        res = b''
+        for label in name.rstrip('.').split('.'):
+            label = label.encode('idna')
+            res += bytes([len(label)]) + label
+        return res + b'\x00'
+
+    @staticmethod
+    def decode_name(data:bytes, pos:int):
+        # returns the decoded name and the position after the name in the original record
+        labels = []
+        end = None
+        for _ in range(128):
+            length = data[pos]
+            if length & 0xC0 == 0xC0:
+                if end is None:
+                    end = pos + 2
+                pos = struct.unpack('!H', data[pos:pos+2])[0] & 0x3FFF
+                continue
+            pos += 1
+            if length == 0:
+                break
+            labels.append(data[pos:pos+length].decode('idna'))
+            pos += length
+        return '.'.join(labels), end if end is not None else pos
+
+    def build_query(self, txid:int, name:str, qtype:str) -> bytes:
+        header = struct.pack('!HHHHHH', txid, 0x0100, 1, 0, 0, 0)
+        return header + self.encode_name(name) + struct.pack('!HH', self.QTYPES[qtype], 1)
+
+    def parse_reply(self, data:bytes, qtype:str):
+        # returns (list of answers, minimum ttl)
+        _, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', data[:12])
+        rcode = flags & 0x000F
+        if rcode == 3:
+            # NXDOMAIN
+            return [], 0
+        if rcode != 0:
+            raise Exception('DNS server returned error code %s' % rcode)
+        pos = 12
+        for _ in range(qdcount):
+            _, pos = self.decode_name(data, pos)
+            pos += 4
+        answers = []
+        ttl = None
+        for _ in range(ancount):
+            _, pos = self.decode_name(data, pos)
+            rtype, _, rttl, rdlength = struct.unpack('!HHIH', data[pos:pos+10])
+            pos += 10
+            if rtype == self.QTYPES[qtype]:
+                if rtype == 1:
+                    answers.append(socket.inet_ntoa(data[pos:pos+4]))
+                else:
+                    answers.append(self.decode_name(data, pos)[0])
+                ttl = rttl if ttl is None else min(ttl, rttl)
+            pos += rdlength
+        return answers, ttl if ttl is not None else 0
+
+    async def query(self, name:str, qtype:str):
+        transport = None
+        try:
+            loop = asyncio.get_running_loop()
+            txid = struct.unpack('!H', os.urandom(2))[0]
+            answer_fut = loop.create_future()
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: DNSClientProtocol(txid, answer_fut),
+                remote_addr=(self.ip, self.port)
+            )
+            transport.sendto(self.build_query(txid, name, qtype))
+            data = await asyncio.wait_for(answer_fut, timeout=self.timeout)
+            answers, ttl = self.parse_reply(data, qtype)
+            return answers, ttl, None
+        except Exception as e:
+            return None, None, e
+        finally:
+            if transport is not None:
+                transport.close()
+
+
+# Resolves names and addresses concurrently with a bounded number of queries in flight.
+# Concurrent lookups of the same name are merged into one query.
+class BulkResolver:
+    def __init__(self, cache:DNSCache, client:DNSUDPClient = None, maxinflight:int = 50, defaultttl:int = 300, negativettl:int = 60):
+        self.cache = cache
+        self.client = client
+        self.defaultttl = defaultttl
+        self.negativettl = negativettl
+        self.semaphore = asyncio.Semaphore(maxinflight)
+        # (qtype, name) -> asyncio.Task of lookups currently running
+        self.pending = {}
+
+    async def __system_lookup(self, name:str, qtype:str):
+        # the system resolver does not expose the TTL, the default TTL is used instead
+        loop = asyncio.get_running_loop()
+        try:
+            if qtype == 'A':
+                res = await loop.getaddrinfo(name, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+                return list(dict.fromkeys([x[4][0] for x in res])), self.defaultttl, None
+            hostname, _ = await loop.getnameinfo((name, 0), socket.NI_NAMEREQD)
+            return [hostname], self.defaultttl, None
+        except socket.gaierror:
+            return [], 0, None
+        except Exception as e:
+            return None, None, e
+
+    async def __lookup(self, name:str, qtype:str):
+        async with self.semaphore:
+            if self.client is not None:
+                qname = name
+                if qtype == 'PTR':
+                    qname = ipaddress.ip_address(name).reverse_pointer
+                answers, ttl, err = await self.client.query(qname, qtype)
+            else:
+                answers, ttl, err = await self.__system_lookup(name, qtype)
+        if err is not None:
+            # network errors are not cached, the lookup will be retried next time
+            return None, err
+        value = answers[0].rstrip('.') if len(answers) > 0 else None
+        self.cache.put(qtype, name, value, ttl if value is not None else self.negativettl)
+        return value, None
+
+    async def resolve(self, name:str, qtype:str):
+        """Returns the first answer of a lookup (or None if there is no record) using the cache"""
+        found, value = self.cache.get(qtype, name)
+        if found is True:
+            return value, None
+        key = (qtype, name.lower())
+        if key not in self.pending:
+            self.pending[key] = asyncio.create_task(self.__lookup(name, qtype))
+        try:
+            return await asyncio.shield(self.pending[key])
+        finally:
+            if key in self.pending and self.pending[key].done() is True:
+                del self.pending[key]
+
+    async def forward(self, hostname:str):
+        return await self.resolve(hostname, 'A')
+
+    async def reverse(self, ip:str):
+        return await self.resolve(ip, 'PTR')
+
+    async def resolve_many(self, queries):
+        """Resolves a list of (name, qtype) tuples concurrently. Returns a list of (value, error) tuples in input order"""
+        return await asyncio.gather(*[self.resolve(name, qtype) for name, qtype in queries])
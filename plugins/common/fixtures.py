@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import functools
+import gzip
+import json
+import time
+
+# ===== RECORD AND REPLAY FIXTURES =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+# It has no OctoPwn dependencies, so it can be tested on its own.
+#
+# A fixture is a gzip compressed JSON lines file. The first line is the header: the fixture version,
+# the kind of the fixture and whatever else the recording plugin stores in it. Every other line is one record.
+#
+# CONNECTION-LEVEL RECORDING
+# --------------------------
+# RecordingProxy wraps an object talking to the network and records the outcome and the duration of
+# every call of the listed methods. ReplayProxy plays the records back without any network: a call
+# returns the recorded outcome after the recorded duration, scaled by `speed` (0 = no delays) plus
+# `latency` seconds. Everything on top of the proxy (executor, timeouts, retries, result classes)
+# runs for real, so changes to that code can be benchmarked offline on the same recorded network.
+#
+# - The proxied methods MUST follow the (result, err) return convention. The results are stored as
+#   JSON (objects with a to_dict method as their dict, anything else JSON can not store as str).
+# - Calls are matched by method name and first argument, in recorded order. When the records of a call
+#   are used up, the last one is repeated: a dead host stays dead, a refused credential stays refused.
+# - A call that never finished while recording (cancelled by a timeout) never finishes when replayed,
+#   so the timeout of the caller decides again.
+# - Attributes listed in `state` are recorded after every call and set on the ReplayProxy when replayed.
+#
+# This works for the connections of a scanner executor (see plugins/intermediate/smbadminmatrix.py)
+# as well as for client sessions, whose do_<command> methods follow the same convention:
+#     session = RecordingProxy(self.octopwnobj.sessions[sid], writer, str(sid), ['do_login', 'do_shares'])
+#     ...
+#     session = ReplayProxy(records[str(sid)], ['do_login', 'do_shares'])
+# Replayed results are the recorded JSON, not the original result objects.
+
+FIXTURE_VERSION = 4
+
+def to_json(obj):
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    return str(obj)
+
+class FixtureWriter:
+    def __init__(self, filepath:str, kind:str, **header):
+        self.filepath = filepath
+        self.handle = gzip.open(filepath, 'wt', encoding='utf-8')
+        self.count = 0
+        header['version'] = FIXTURE_VERSION
+        header['kind'] = kind
+        self.write_line(header)
+
+    def write_line(self, obj):
+        self.handle.write(json.dumps(obj, separators=(',', ':'), default=to_json) + '\n')
+
+    def write_record(self, record:list):
+        self.write_line(record)
+        self.count += 1
+
+    def close(self):
+        self.handle.close()
+
+class FixtureReader:
+    @staticmethod
+    def load(filepath:str, kind:str = None):
+        """Returns the header and the list of records. Raises an exception if the version or the kind of the fixture does not match"""
+        header = None
+        records = []
+        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if header is None:
+                    header = json.loads(line)
+                    if isinstance(header, dict) is False or header.get('version') != FIXTURE_VERSION:
+                        raise Exception('Unsupported fixture version %s' % (header.get('version') if isinstance(header, dict) else None))
+                    if kind is not None and header.get('kind') != kind:
+                        raise Exception('Fixture of kind %s can not be used here (expected %s)' % (header.get('kind'), kind))
+                    continue
+                records.append(json.loads(line))
+        if header is None:
+            raise Exception('Empty fixture file %s' % filepath)
+        return header, records
+
+    @staticmethod
+    def group(records:list):
+        """Groups records by their first field (target or session) keeping the recorded order"""
+        groups = {}
+        for record in records:
+            if record[0] not in groups:
+                groups[record[0]] = []
+            groups[record[0]].append(record)
+        return groups
+
+
+# The recorded error. str() and repr() return the text of the original error,
+# as the results and ScannerError objects built from it use either of them
+class ReplayedError(Exception):
+    def __init__(self, text:str, reprtext:str = None):
+        Exception.__init__(self, text)
+        self.text = text
+        self.reprtext = reprtext if reprtext is not None else text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return self.reprtext
+
+    @staticmethod
+    def encode(err):
+        if err is None:
+            return None
+        return [str(err), repr(err)]
+
+    @staticmethod
+    def decode(data):
+        if data is None:
+            return None
+        return ReplayedError(data[0], data[1])
+
+# The replayed code made a call which is not in the fixture
+class ReplayMismatchError(Exception):
+    pass
+
+
+def call_key(args) -> str:
+    if len(args) == 0:
+        return None
+    return str(args[0])
+
+# Records [key, method, first argument, duration, hung, raised, result, error, state] for every call
+class RecordingProxy:
+    def __init__(self, obj, writer:FixtureWriter, key:str, methods:list, state:list = None):
+        # set directly, every other attribute is written to the wrapped object
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_writer', writer)
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, '_methods', methods)
+        object.__setattr__(self, '_state', state if state is not None else [])
+
+    def __getattr__(self, name):
+        value = getattr(self._obj, name)
+        if name in self._methods:
+            return functools.partial(self._record, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+    async def _record(self, name, method, *args, **kwargs):
+        start = time.monotonic()
+        hung = False
+        raised = False
+        result, err = None, None
+        try:
+            result, err = await method(*args, **kwargs)
+            return result, err
+        except asyncio.CancelledError:
+            hung = True
+            raise
+        except Exception as e:
+            raised = True
+            err = e
+            raise
+        finally:
+            self._writer.write_record([
+                self._key,
+                name,
+                call_key(args),
+                round(time.monotonic() - start, 4),
+                hung,
+                raised,
+                result,
+                ReplayedError.encode(err),
+                {attr : getattr(self._obj, attr) for attr in self._state},
+            ])
+
+# Plays back the records of one key (target or session), see the description at the top of the file
+class ReplayProxy:
+    def __init__(self, records, methods:list, speed:float = 1.0, latency:float = 0, state:dict = None):
+        self._methods = methods
+        self._speed = speed
+        # seconds
+        self._latency = latency
+        # a list of records, or the calls returned by ReplayProxy.index to share them between several
+        # proxies (e.g. every connection made to the same host consumes the records of that host)
+        self._calls = records if isinstance(records, dict) else ReplayProxy.index(records)
+        if state is not None:
+            for attr in state:
+                setattr(self, attr, state[attr])
+
+    @staticmethod
+    def index(records:list):
+        """Returns (method, first argument) -> records in recorded order"""
+        calls = {}
+        for record in records:
+            key = (record[1], record[2])
+            if key not in calls:
+                calls[key] = collections.deque()
+            calls[key].append(record)
+        return calls
+
+    def __getattr__(self, name):
+        if name.startswith('_') is False and name in self._methods:
+            return functools.partial(self._replay, name)
+        raise AttributeError(name)
+
+    async def _replay(self, name, *args, **kwargs):
+        key = (name, call_key(args))
+        if key not in self._calls:
+            raise ReplayMismatchError('No recorded call of %s(%s)' % key)
+        records = self._calls[key]
+        record = records.popleft() if len(records) > 1 else records[0]
+        _, _, _, duration, hung, raised, result, error, state = record
+
+        delay = self._latency
+        if self._speed > 0:
+            delay += duration / self._speed
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if hung is True:
+            # only a timeout of the caller ends this call
+            await asyncio.get_running_loop().create_future()
+
+        for attr in state:
+            setattr(self, attr, state[attr])
+        if raised is True:
+            raise ReplayedError.decode(error)
+        return result, ReplayedError.decode(error)
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from asysocks.unicomm.common.scanner.common import *
+from plugins.common.results import RESULT_CLASSES, result_class_name
+from plugins.common.fixtures import FixtureWriter, FixtureReader, ReplayedError
+
+# ===== RESULT-LEVEL RECORD AND REPLAY =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+#
+# Records and replays the results an executor put in the out_queue (ScannerData/ScannerError), not
+# the network traffic. The executor and protocol code of the recorded scanner do NOT run during the
+# replay, only everything after the executor does: rebuilding the results with their real result
+# class (`from_dict`), their to_line/to_dict serialization, the scanner core and the result processing.
+# This is the only option for scanners whose executor is not part of this repository (SMBADMIN, PORTSCAN...).
+# To replay the executor as well, record at the connection level, see plugins/common/fixtures.py.
+#
+# Result classes are looked up by qualified name in RESULT_CLASSES (plugins/common/results.py).
+# Results of classes which are not registered are replayed as their recorded text.
+#
+# Every record is [target, delay, type, result class, line, dict]
+
+FIXTURE_KIND = 'results'
+
+class ResultFixtureWriter(FixtureWriter):
+    def __init__(self, filepath:str, scannertype:str = None, resultheaders:list = None):
+        FixtureWriter.__init__(self, filepath, FIXTURE_KIND, scanner = scannertype, resultheaders = resultheaders)
+
+    def write_result(self, target, delay:float, result):
+        """Stores a ScannerData or ScannerError object, other scanner results (progress, target done...) are skipped"""
+        rtype = getattr(result, 'type', None)
+        if rtype is None:
+            raise ValueError('Not a scanner result: %s' % type(result).__name__)
+        if rtype == ScannerResultType.DATA:
+            data = result.data
+            line = data.to_line() if hasattr(data, 'to_line') else str(data)
+            rdict = data.to_dict() if hasattr(data, 'to_dict') else None
+            self.write_record([str(target), round(delay, 4), 'DATA', result_class_name(type(data)), line, rdict])
+        elif rtype == ScannerResultType.ERROR:
+            # ScannerError already holds the text of the error
+            self.write_record([str(target), round(delay, 4), 'ERROR', None, str(result.data), None])
+
+class ResultFixtureReader:
+    @staticmethod
+    def load(filepath:str):
+        """Returns the header and a dict of target -> list of (delay, type, result class, line, dict) in recorded order"""
+        header, records = FixtureReader.load(filepath, FIXTURE_KIND)
+        targets = {}
+        for target, trecords in FixtureReader.group(records).items():
+            targets[target] = [tuple(record[1:]) for record in trecords]
+        return header, targets
+
+
+# Fallback for results whose class is not registered in RESULT_CLASSES,
+# it reproduces the recorded to_line/to_dict output of the original result class
+class ReplayedResult:
+    __slots__ = ('line', 'rdict')
+
+    def __init__(self, line:str, rdict:dict):
+        self.line = line
+        self.rdict = rdict
+
+    def to_line(self, separator = '\t') -> str:
+        if separator != '\t':
+            return self.line.replace('\t', separator)
+        return self.line
+
+    def to_dict(self):
+        if self.rdict is None:
+            return {'line' : self.line}
+        return self.rdict
+
+
+# Wraps an executor and records every result it produces, with the delay since the start of the run
+class RecordingExecutor:
+    def __init__(self, executor, writer:ResultFixtureWriter):
+        self.executor = executor
+        self.writer = writer
+
+    async def run(self, targetid, target, out_queue):
+        tap_queue = asyncio.Queue()
+        start = time.monotonic()
+        task = asyncio.create_task(self.executor.run(targetid, target, tap_queue))
+        try:
+            while task.done() is False or tap_queue.qsize() > 0:
+                getter = asyncio.create_task(tap_queue.get())
+                await asyncio.wait([getter, task], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done() is False:
+                    getter.cancel()
+                    continue
+                result = getter.result()
+                self.writer.write_result(target, time.monotonic() - start, result)
+                await out_queue.put(result)
+        finally:
+            task.cancel()
+
+
+# Replays the recorded results of one target into the out_queue
+class ReplayExecutor:
+    def __init__(self, targets:dict, result_classes:dict = None, speed:float = 1.0, latency:float = 0):
+        self.targets = targets
+        # result class name -> class with a from_dict method
+        self.result_classes = result_classes if result_classes is not None else RESULT_CLASSES
+        self.speed = speed
+        # seconds
+        self.latency = latency
+
+    async def run(self, targetid, target, out_queue):
+        try:
+            if self.latency > 0:
+                await asyncio.sleep(self.latency)
+            elapsed = 0
+            for delay, rtype, rclass, rline, rdict in self.targets.get(str(target), []):
+                if self.speed > 0 and delay > elapsed:
+                    await asyncio.sleep((delay - elapsed) / self.speed)
+                    elapsed = delay
+                if rtype == 'DATA':
+                    if rclass in self.result_classes and rdict is not None:
+                        data = self.result_classes[rclass].from_dict(rdict)
+                    else:
+                        data = ReplayedResult(rline, rdict)
+                    await out_queue.put(ScannerData(target, data))
+                else:
+                    await out_queue.put(ScannerError(target, ReplayedError(rline)))
+        except Exception as e:
+            await out_queue.put(ScannerError(target, e))
+            return
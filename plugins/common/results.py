@@ -0,0 +1,106 @@
+import re
+import sys
+import keyword
+
+# ===== RESULT CLASS GENERATOR =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+# It has no OctoPwn dependencies, so it can be tested on its own.
+#
+# create_result_class builds a scanner result class from the `resultheaders` list of a scanner.
+# See plugins/intermediate/registerscanner.py for how a scanner uses it.
+# RESULT_CLASSES maps qualified class names to result classes, see plugins/common/resultreplay.py.
+
+# Members of the generated class, a header can not be stored under these names
+RESERVED_NAMES = ('self', 'to_line', 'to_dict', 'to_lines', 'to_dicts', 'from_dict', 'headers')
+
+# Result classes by qualified name (module.qualname). The REPLAY scanner uses it to rebuild recorded
+# results with their real class (via from_dict), so the replay runs the same to_line/to_dict code as a live scan.
+# Generated classes are registered automatically, hand written ones with the register_result_class decorator.
+# Two plugins can use the same class name, the module keeps them apart. Registering a class again
+# under the same qualified name (e.g. when a plugin module is reloaded) replaces the old one.
+RESULT_CLASSES = {}
+
+def result_class_name(cls) -> str:
+    """Returns the name a result class is registered under"""
+    return '%s.%s' % (cls.__module__, cls.__qualname__)
+
+def register_result_class(cls):
+    """Registers a result class with a from_dict class method for replaying, can be used as a decorator"""
+    if hasattr(cls, 'from_dict') is False:
+        raise ValueError('Result class %s has no from_dict method' % cls.__name__)
+    RESULT_CLASSES[result_class_name(cls)] = cls
+    return cls
+
+def header_to_field(header) -> str:
+    """Converts a header to a valid attribute name (which may still collide with another field)"""
+    # leading underscores are stripped, `__x` would be name mangled in the generated methods
+    field = re.sub(r'\W', '_', str(header)).lstrip('_')
+    if field == '':
+        field = 'field'
+    if field[0].isdigit():
+        field = 'f_' + field
+    if keyword.iskeyword(field) or field in RESERVED_NAMES:
+        field = field + '_'
+    return field
+
+def create_result_class(name:str, resultheaders:list, types:dict = None, skip:int = 1, module:str = None):
+    """Generates a slotted result class with to_line/to_dict serializers from the resultheaders list.
+    The first `skip` headers are left out, as the target column is stored in the ScannerData object, not in the result.
+    `types` optionally maps header names to types (used for the type annotations only, default is str).
+    `module` is the module the class belongs to, by default the module of the caller (like collections.namedtuple).
+    Raises ValueError if a header is listed more than once, as to_dict would silently drop one of them"""
+    if types is None:
+        types = {}
+    if module is None:
+        module = sys._getframe(1).f_globals.get('__name__', '__main__')
+    headers = [str(header) for header in resultheaders[skip:]]
+    duplicates = sorted(set([header for header in headers if headers.count(header) > 1]))
+    if len(duplicates) > 0:
+        raise ValueError('Duplicate result headers for %s: %s' % (name, ', '.join(duplicates)))
+
+    fields = []
+    for header in headers:
+        field = header_to_field(header)
+        # different headers can still map to the same field ('a b' and 'a-b'), those get a numeric suffix
+        if field in fields:
+            i = 2
+            while '%s_%d' % (field, i) in fields:
+                i += 1
+            field = '%s_%d' % (field, i)
+        fields.append(field)
+
+    values = ', '.join(['str(r.%s)' % field for field in fields])
+    items = ', '.join(['%r : r.%s' % (header, field) for header, field in zip(headers, fields)])
+    source = '\n'.join([
+        'def __init__(self, %s):' % ', '.join(fields),
+        '\n'.join(['    self.%s = %s' % (field, field) for field in fields]) if len(fields) > 0 else '    pass',
+        'def to_line(r, separator = "\\t"):',
+        '    return separator.join((%s,))' % values if len(fields) > 0 else '    return ""',
+        'def to_dict(r):',
+        '    return {%s}' % items,
+        'def to_lines(cls, results, separator = "\\t"):',
+        '    return [separator.join((%s,)) for r in results]' % values if len(fields) > 0 else '    return ["" for r in results]',
+        'def to_dicts(cls, results):',
+        '    return [{%s} for r in results]' % items,
+        'def from_dict(cls, d):',
+        '    return cls(%s)' % ', '.join(['d.get(%r)' % header for header in headers]),
+    ])
+    namespace = {}
+    exec(source, namespace)
+
+    def __repr__(self):
+        return '%s(%s)' % (name, ', '.join(['%s=%r' % (field, getattr(self, field)) for field in fields]))
+
+    return register_result_class(type(name, (), {
+        '__slots__' : tuple(fields),
+        '__annotations__' : {field: types.get(header, str) for header, field in zip(headers, fields)},
+        '__init__' : namespace['__init__'],
+        '__repr__' : __repr__,
+        'to_line' : namespace['to_line'],
+        'to_dict' : namespace['to_dict'],
+        'to_lines' : classmethod(namespace['to_lines']),
+        'to_dicts' : classmethod(namespace['to_dicts']),
+        'from_dict' : classmethod(namespace['from_dict']),
+        'headers' : tuple(headers),
+        '__module__' : module,
+    }))
@@ -0,0 +1,42 @@
+# ===== ADAPTIVE TIMEOUT HELPERS =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+# It has no OctoPwn dependencies, so it can be tested on its own.
+#
+# RTTTracker keeps a smoothed round-trip time and its variance per host and over all hosts
+# (the same estimator TCP uses for its retransmission timeout), and derives connection
+# timeouts from it. See plugins/intermediate/smbadminmatrix.py for how a scanner uses it.
+
+
+# Tracks the round-trip time per host and computes per-connection timeouts from it
+class RTTTracker:
+    def __init__(self, initialtimeout:float, mintimeout:float, maxtimeout:float):
+        self.initialtimeout = initialtimeout
+        self.mintimeout = mintimeout
+        self.maxtimeout = maxtimeout
+        # host -> (smoothed rtt, rtt variance)
+        self.hosts = {}
+        # estimate over all hosts, used for hosts without samples
+        self.network = None
+
+    @staticmethod
+    def __smooth(estimate, rtt:float):
+        if estimate is None:
+            return rtt, rtt / 2
+        srtt, rttvar = estimate
+        rttvar = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+        srtt = 0.875 * srtt + 0.125 * rtt
+        return srtt, rttvar
+
+    def update(self, host:str, rtt:float):
+        self.hosts[host] = self.__smooth(self.hosts.get(host), rtt)
+        self.network = self.__smooth(self.network, rtt)
+
+    def get_timeout(self, host:str, attempt:int = 0):
+        estimate = self.hosts.get(host, self.network)
+        if estimate is None:
+            timeout = self.initialtimeout
+        else:
+            srtt, rttvar = estimate
+            timeout = srtt + 4 * rttvar
+        timeout = timeout * (2 ** attempt)
+        return min(max(timeout, self.mintimeout), self.maxtimeout)
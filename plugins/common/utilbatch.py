@@ -0,0 +1,126 @@
+import asyncio
+import shlex
+
+# ===== BATCH / SCRIPT MODE FOR UTIL SESSIONS =====
+# This module is a helper shared by the plugins, it is not a plugin itself.
+#
+# Every do_<command> call normally goes through the console command queue and prints its own result.
+# For scripted workflows with thousands of invocations this is a lot of overhead, so the batch mode
+# dispatches the commands directly to the methods of the session and gathers the outputs into one result.
+#
+# Usage: add the mixin BEFORE ScannerConsoleBase to the base classes of the UTIL session
+#     class ExampleUtil(UtilBatchMixin, ScannerConsoleBase):
+# and list the 'batch' command in the help_groups if you define any help.
+#
+# Commands are dispatched to the do_<command> methods. If a command has an API variant that returns
+# the result instead of printing it, list it in `batch_api_commands` (command name -> method name)
+# and the batch mode will call that method instead:
+#     batch_api_commands = {'examplecmd' : 'examplecmd'}
+#
+# Arguments are whitespace separated, quotes group arguments containing spaces.
+# Backslashes are kept as they are, so `DOMAIN\user` and `\\server\share` arguments work.
+# The login check of the console (login_ok / nologon_commands) is applied to every command.
+
+
+class UtilBatchMixin:
+    # command name -> name of the non-printing API method used in batch mode
+    batch_api_commands = {}
+    # commands that can not be used inside a batch (to avoid recursion)
+    batch_blacklist = ['batch']
+
+    @staticmethod
+    def split_batch_line(line:str):
+        """Splits a command line into arguments. Unlike POSIX shlex, backslashes are not escape characters"""
+        args = []
+        for arg in shlex.split(line, posix=False):
+            if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in ['"', "'"]:
+                arg = arg[1:-1]
+            args.append(arg)
+        return args
+
+    def resolve_batch_command(self, line:str):
+        """Returns the method and arguments to execute for a command line"""
+        args = self.split_batch_line(line)
+        cmdname = args[0].lower()
+        if cmdname in self.batch_blacklist:
+            raise Exception(f'Command "{cmdname}" is not allowed in batch mode')
+        # same check as the console does before executing a command
+        if self.login_ok is False and 'any' not in self.nologon_commands and cmdname not in self.nologon_commands:
+            raise Exception(f'Command "{cmdname}" requires login')
+        if cmdname in self.batch_api_commands:
+            return getattr(self, self.batch_api_commands[cmdname]), args[1:]
+        func = getattr(self, f'do_{cmdname}', None)
+        if func is None:
+            raise Exception(f'Unknown command "{cmdname}"')
+        return func, args[1:]
+
+    @staticmethod
+    async def read_script(filepath:str):
+        """Yields the command lines of a script file. Empty lines and lines starting with # are skipped"""
+        with open(filepath, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                yield line
+
+    async def batch(self, commands, concurrency:int = 1):
+        """Executes a stream of commands (list, iterator or async iterator of command lines) and returns the list of results in input order"""
+        try:
+            concurrency = max(1, int(concurrency))
+            results = {}
+            cmd_queue = asyncio.Queue(concurrency * 2)
+
+            async def worker():
+                while True:
+                    x = await cmd_queue.get()
+                    if x is None:
+                        return
+                    idx, line = x
+                    try:
+                        func, args = self.resolve_batch_command(line)
+                        res, err = await func(*args)
+                    except Exception as e:
+                        res, err = None, e
+                    results[idx] = {
+                        'command' : line,
+                        'result' : res,
+                        'error' : str(err) if err is not None else None,
+                    }
+
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+            try:
+                idx = 0
+                if hasattr(commands, '__aiter__'):
+                    async for line in commands:
+                        await cmd_queue.put((idx, line))
+                        idx += 1
+                else:
+                    for line in commands:
+                        await cmd_queue.put((idx, line))
+                        idx += 1
+                for _ in range(concurrency):
+                    await cmd_queue.put(None)
+                await asyncio.gather(*workers)
+            finally:
+                for w in workers:
+                    w.cancel()
+
+            return [results[i] for i in range(idx)], None
+        except Exception as e:
+            return None, e
+
+    async def do_batch(self, filepath:str, concurrency:str = '1'):
+        """Executes the commands listed in a file (one command per line), optionally running <concurrency> commands in parallel"""
+        try:
+            results, err = await self.batch(self.read_script(filepath), int(concurrency))
+            if err is not None:
+                raise err
+            failed = [res for res in results if res['error'] is not None]
+            for res in failed:
+                await self.print(f"[-] {res['command']} -> {res['error']}")
+            await self.print(f"[+] Batch finished: {len(results)} commands, {len(failed)} failed")
+            return results, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
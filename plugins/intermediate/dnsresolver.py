@@ -0,0 +1,184 @@
+import copy
+from octopwn.common.plugins import OctoPwnSessionRegisterPlugin
+
+from octopwn.clients.scannerbase import ScannerConsoleBase
+from octopwn.common.scanparams import InfoScanParameter, strlist, strbool, ScanParameter, ScanParameterCollection
+from plugins.common.utilbatch import UtilBatchMixin
+from plugins.common.dns import DNSCache, DNSUDPClient, BulkResolver
+
+# =====================================================================
+# BULK HOSTNAME RESOLUTION FOR TARGETS
+# =====================================================================
+# Some protocols (like Kerberos) require FQDN hostnames, and OctoPwn skips DNS resolution
+# when a target already has a hostname. Targets added by IP only need to be resolved first.
+#
+# This utility resolves many targets concurrently:
+# - targets with an IP but no hostname get a reverse (PTR) lookup
+# - targets with a hostname but no IP get a forward (A) lookup
+# - at most `maxinflight` queries are running at the same time, over all commands of the session
+#   (batch mode included), and concurrent lookups of the same name are merged
+# - answers are cached for their TTL, failed lookups are cached for `negativettl` seconds
+# - the cache is stored on the octopwn object, so every plugin using DNSCache.get_shared() shares it
+# - the resolved data is written back through the target update API of the OctoPwn core
+#   (`update_target`), which stores the enriched target and notifies the GUI. The missing hostname
+#   or IP of the existing target is filled in, no new targets are created.
+#
+# By default the system resolver is used. If the `nameserver` parameter is set (e.g. the DC's IP)
+# the queries are sent directly to that server over UDP. It accepts an optional port (`127.0.0.1:5353`)
+# so the resolver can be tested against a local stub DNS server.
+
+
+class OctoPwnPlugin(OctoPwnSessionRegisterPlugin):
+    def __init__(self):
+        OctoPwnSessionRegisterPlugin.__init__(self, 'UTIL', 'DNSRESOLVER', DNSResolverUtil)
+
+
+class DNSResolverUtil(UtilBatchMixin, ScannerConsoleBase):
+    # in batch mode the lookups return their results without printing them
+    batch_api_commands = {'resolve' : 'resolve_hostname', 'reverse' : 'reverse_ip'}
+
+    def __init__(self, projectid, client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params = None, history = None):
+        default_params = ScanParameterCollection(
+            ScanParameter('nameserver', str, 'DNS server to query (ip or ip:port). Empty uses the system resolver', default='', required=False, advanced=False),
+            ScanParameter('maxinflight', int, 'Maximum number of DNS queries running at the same time', default=50, required=False, advanced=True),
+            ScanParameter('timeout', int, 'Timeout of a single DNS query in seconds', default=2, required=False, advanced=True),
+            ScanParameter('defaultttl', int, 'Cache time in seconds for answers without TTL (system resolver)', default=300, required=False, advanced=True),
+            ScanParameter('negativettl', int, 'Cache time in seconds for failed lookups', default=60, required=False, advanced=True),
+        )
+        ScannerConsoleBase.__init__(self, projectid,  'UTIL', 'DNSRESOLVER', client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params, history, default_params=default_params)
+
+        self.nologon_commands.append('any')
+        self.help_groups['COMMANDS'] = {
+            '__skip': {'start': 0, 'stop': 0, 'scan': 0},
+            'RESOLVE' : {'resolvetargets':0, 'resolve':0, 'reverse':0,},
+            'CACHE' : {'cachestats':0, 'cacheclear':0,},
+            'BATCH' : {'batch':0,},
+        }
+
+        self.resolver = None
+        self.resolver_config = None
+
+    def get_resolver(self):
+        # one resolver per session, so the in-flight limit and the merging of duplicate lookups apply
+        # to every command, including concurrent ones in batch mode. It is rebuilt when the parameters change.
+        config = (
+            DNSCache.get_shared(self.octopwnobj),
+            self.params.getvalue('nameserver'),
+            int(self.params.getvalue('maxinflight')),
+            int(self.params.getvalue('timeout')),
+            int(self.params.getvalue('defaultttl')),
+            int(self.params.getvalue('negativettl')),
+        )
+        if self.resolver is None or config != self.resolver_config:
+            cache, nameserver, maxinflight, timeout, defaultttl, negativettl = config
+            client = None
+            if nameserver is not None and nameserver != '':
+                client = DNSUDPClient.from_string(nameserver, timeout)
+            self.resolver = BulkResolver(cache, client, maxinflight, defaultttl, negativettl)
+            self.resolver_config = config
+        return self.resolver
+
+    async def enrich_target(self, tid, ip:str = None, hostname:str = None):
+        """Fills in the missing IP or hostname of a target through the target update API of the core"""
+        target = copy.copy(self.octopwnobj.targets[tid])
+        if ip is not None:
+            target.ip = ip
+        if hostname is not None:
+            target.hostname = hostname
+        return await self.octopwnobj.update_target(tid, target)
+
+    async def resolve_hostname(self, hostname:str):
+        return await self.get_resolver().forward(hostname)
+
+    async def reverse_ip(self, ip:str):
+        return await self.get_resolver().reverse(ip)
+
+    async def do_resolve(self, hostname:str):
+        """Resolves a hostname to an IP address"""
+        try:
+            ip, err = await self.resolve_hostname(hostname)
+            if err is not None:
+                raise err
+            await self.print(f'{hostname} -> {ip}')
+            return ip, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_reverse(self, ip:str):
+        """Resolves an IP address to a hostname"""
+        try:
+            hostname, err = await self.reverse_ip(ip)
+            if err is not None:
+                raise err
+            await self.print(f'{ip} -> {hostname}')
+            return hostname, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_resolvetargets(self):
+        """Resolves all targets missing either the hostname or the IP address and updates them"""
+        try:
+            if hasattr(self.octopwnobj, 'update_target') is False:
+                raise Exception('The OctoPwn core has no target update API, the targets can not be enriched')
+            resolver = self.get_resolver()
+            tids = []
+            queries = []
+            for tid in self.octopwnobj.targets:
+                target = self.octopwnobj.targets[tid]
+                if target.ip is not None and target.hostname is None:
+                    tids.append(tid)
+                    queries.append((target.ip, 'PTR'))
+                elif target.hostname is not None and target.ip is None:
+                    tids.append(tid)
+                    queries.append((target.hostname, 'A'))
+
+            await self.print(f'[+] Resolving {len(queries)} targets...')
+            results = await resolver.resolve_many(queries)
+
+            # Targets are immutable, but they can be enriched with additional data (see basics/targets.py).
+            # Adding a new Target(ip, hostname) would create a second target next to the existing one,
+            # and changing the stored object directly is neither persisted nor shown in the GUI.
+            enriched = 0
+            failed = 0
+            for tid, (name, qtype), (value, err) in zip(tids, queries, results):
+                if err is not None or value is None:
+                    failed += 1
+                    continue
+                if qtype == 'PTR':
+                    _, err = await self.enrich_target(tid, hostname = value)
+                else:
+                    _, err = await self.enrich_target(tid, ip = value)
+                if err is not None:
+                    await self.print(f'[-] Failed to update target {tid}: {err}')
+                    failed += 1
+                    continue
+                enriched += 1
+
+            await self.print(f'[+] Resolved {enriched} targets, {failed} failed')
+            return enriched, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_cachestats(self):
+        """Prints the statistics of the shared DNS cache"""
+        try:
+            stats = DNSCache.get_shared(self.octopwnobj).to_dict()
+            for key in stats:
+                await self.print(f'{key}: {stats[key]}')
+            return stats, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_cacheclear(self):
+        """Clears the shared DNS cache"""
+        try:
+            DNSCache.get_shared(self.octopwnobj).clear()
+            await self.print('[+] DNS cache cleared')
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
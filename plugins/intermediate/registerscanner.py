@@ -4,6 +4,7 @@ from octopwn.common.plugins import OctoPwnSessionRegisterPlugin
 from octopwn.clients.scannerbase import ScannerConsoleBase
 from octopwn.common.scanparams import InfoScanParameter, strlist, strbool, ScanParameter, ScanParameterCollection, CredentialedSMBScannerBaseParameters
 from asysocks.unicomm.common.scanner.common import *
+from plugins.common.results import create_result_class
 
 
 
@@ -19,26 +20,28 @@ class OctoPwnPlugin(OctoPwnSessionRegisterPlugin):
 # the result class is used to store the results of the scanner.
 # it is used to store the results of the scanner in a way that is easy to serialize and deserialize.
 # it is also used to store the results of the scanner in a way that is easy to display in the GUI.
-class ExampleScannerResult:
-    def __init__(self, result1:str, result2:str):
-        self.result1 = result1
-        self.result2 = result2
-    
-    # The to_line method MUST be implemented.
-    # the to_line method is used to convert the result to a SINGLE line of text.
-    # this is used when the results are displayed in a table in the GUI or printed to the console
-    def to_line(self, separator = '\t') -> str:
-        return f'{self.result1}{separator}{self.result2}'
-    
-    # The to_dict method MUST be implemented.
-    # the to_dict method is used to convert the result to a dictionary.
-    # this is used when the scanner result is stored in a scan history or when the results are exported.
-    # IMPORTANT: the keys MUST be strings, the values can be anything JSON serializable.
-    def to_dict(self):
-        return {
-            'result1' : self.result1,
-            'result2' : self.result2,
-        }
+#
+# The result class MUST implement two methods:
+# - to_line(separator = '\t') converts the result to a SINGLE line of text.
+#   this is used when the results are displayed in a table in the GUI or printed to the console
+# - to_dict() converts the result to a dictionary.
+#   this is used when the scanner result is stored in a scan history or when the results are exported.
+#   IMPORTANT: the keys MUST be strings, the values can be anything JSON serializable.
+#
+# You can write the result class by hand, but as the columns are already listed in the `resultheaders`
+# parameter of the scanner, the `create_result_class` function (plugins/common/results.py) can generate it for you.
+# The generated class uses __slots__ (no per-instance __dict__, which matters for scans with many results)
+# and has pre-compiled to_line/to_dict methods, plus to_lines/to_dicts class methods to serialize
+# a whole list of results at once. Headers are turned into valid attribute names (headers clashing
+# with the generated methods, like `to_dict`, get a `_` suffix), listing the same header twice is an error.
+
+# the headers of the result table in the GUI. Note that the first column is the target which
+# is not incorporated in the ExampleScannerResult, rather in the ScannerData object. `await out_queue.put(ScannerData(target,....`
+EXAMPLE_RESULTHEADERS = ['SERVERIP', 'result1', 'result2']
+
+# this generates the equivalent of a hand written class with a `__init__(self, result1, result2)`
+# and the to_line/to_dict methods described above.
+ExampleScannerResult = create_result_class('ExampleScannerResult', EXAMPLE_RESULTHEADERS, types = {'result1': str, 'result2': str})
 
 # The Executor class is passed to the scanner core, and it's ``run`` method is called with the target and output queue.
 # This class doesn't orchestrate the scanner, it's only responsible for performing action(s) against one target specified in the run method and creating the scanner result and putting it in the output queue.
@@ -64,9 +67,8 @@ class ExampleScanner(ScannerConsoleBase):
     def __init__(self, projectid, client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params = None, history = None):
         default_params = ScanParameterCollection(
                 CredentialedSMBScannerBaseParameters(
-                    # the headers of the result table in the GUI. Note that the first column is the target which
-                    # is not incorporated in the ExampleScannerResult, rather in the ScannerData object. `await out_queue.put(ScannerData(target,....`
-                    resultheaders = ['SERVERIP', 'result1', 'result2'], 
+                    # the headers of the result table in the GUI, the ExampleScannerResult class is generated from the same list.
+                    resultheaders = EXAMPLE_RESULTHEADERS, 
                     # The info is optional, it's used to provide a description of the scanner.
                     info='Example scanner',
                 ),
@@ -3,6 +3,7 @@ from octopwn.common.plugins import OctoPwnSessionRegisterPlugin
 
 from octopwn.clients.scannerbase import ScannerConsoleBase
 from octopwn.common.scanparams import InfoScanParameter, strlist, strbool, ScanParameter, ScanParameterCollection, CredentialedSMBScannerBaseParameters
+from plugins.common.utilbatch import UtilBatchMixin
 
 
 
@@ -15,7 +16,12 @@ class OctoPwnPlugin(OctoPwnSessionRegisterPlugin):
         OctoPwnSessionRegisterPlugin.__init__(self, 'UTIL', 'EXAMPLEUTIL', ExampleUtil) 
 
 
-class ExampleUtil(ScannerConsoleBase):
+# The UtilBatchMixin adds the `batch` command (and the batch() API method) to the session,
+# which executes many commands at once without a console round-trip for each of them.
+class ExampleUtil(UtilBatchMixin, ScannerConsoleBase):
+    # examplecmd has a non-printing API variant, the batch mode uses that one
+	batch_api_commands = {'examplecmd' : 'examplecmd'}
+
 	def __init__(self, projectid, client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params = None, history = None):
         # default_params is a collection of parameters that provide a persistent way to store parameters between restarts.
         # the parameters are stored in the octopwn.session file and reload automatically when octopwn is restarted.
@@ -37,6 +43,7 @@ class ExampleUtil(ScannerConsoleBase):
 		self.help_groups['COMMANDS'] = {
 			'__skip': {'start': 0, 'stop': 0, 'scan': 0},
 			'EXAMPLECMDGROUP' : {'examplecmd':0,},
+			'BATCH' : {'batch':0,},
 		}
 	
     # the do_<command> functions are the commands that the users can interact with from the GUI.
@@ -51,8 +58,19 @@ class ExampleUtil(ScannerConsoleBase):
 	async def do_examplecmd(self, cmd:str):
 		"""This is an example command that prints the command given to it"""
 		try:
-			await self.print(f"Command received: {cmd}")
+			res, err = await self.examplecmd(cmd)
+			if err is not None:
+				raise err
+			await self.print(res)
 			return True, None
 		except Exception as e:
 			await self.print_exc(e)
+			return None, e
+
+    # API-only counterpart of do_examplecmd. It returns the result instead of printing it,
+    # which is what the batch mode uses (see batch_api_commands) to avoid a console round-trip for every command.
+	async def examplecmd(self, cmd:str):
+		try:
+			return f"Command received: {cmd}", None
+		except Exception as e:
 			return None, e
\ No newline at end of file
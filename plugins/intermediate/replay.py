@@ -0,0 +1,181 @@
+import asyncio
+import time
+import tracemalloc
+from octopwn.common.plugins import OctoPwnSessionRegisterPlugin
+
+from octopwn.clients.scannerbase import ScannerConsoleBase
+from octopwn.common.scanparams import InfoScanParameter, strlist, strbool, ScanParameter, ScanParameterCollection
+from asysocks.unicomm.common.scanner.common import *
+from asysocks.unicomm.common.scanner.scanner import UniScanner
+from asysocks.unicomm.common.scanner.targetgen import UniTargetGen
+from plugins.common.results import RESULT_CLASSES
+from plugins.common.resultreplay import ResultFixtureWriter, ResultFixtureReader, ReplayExecutor
+
+# =====================================================================
+# RECORD AND REPLAY OF SCAN RESULTS
+# =====================================================================
+# Every example plugin scans live lab targets, so the performance of plugin changes can not be
+# compared between runs. Recorded fixtures make them comparable offline, at one of two levels:
+#
+# CONNECTION LEVEL (plugins/common/fixtures.py): the calls the executor makes on its connections are
+# recorded with their outcome and duration, and replayed without network. The executor itself,
+# its timeouts, retries and connection reuse run for real, so executor changes can be measured.
+# The SMBADMINMATRIX scanner supports it with its `recordfile` and `replayfile` parameters.
+# The same proxies can record client sessions (their do_<command> calls), see plugins/common/fixtures.py.
+#
+# RESULT LEVEL (this scanner, plugins/common/resultreplay.py): the results an executor produced are
+# replayed, not the traffic, so the executor and protocol code of the recorded scanner do NOT run.
+# What is measured is everything after the executor: rebuilding the results with their real result
+# class (`from_dict`), their to_line/to_dict serialization, the scanner core, the result processing
+# and the scan history. This works for any scanner, also those whose executor is not in this repository.
+# Result classes are looked up by qualified name in RESULT_CLASSES (plugins/common/results.py). Classes made by
+# `create_result_class` are registered automatically, hand written ones with `@register_result_class`.
+# Results of classes which are not registered are replayed as their recorded text, and a warning is printed.
+#
+# RECORDING
+# ---------
+# 1. From any scanner session (SMBADMIN, PORTSCAN, EXAMPLESCANNER...) after it finished:
+#    `record <session id> <fixture file>` stores the results of the last scan of that session.
+#    The scan history does not contain timing information, use the `latency` parameter when replaying.
+# 2. From your own scanner, with timing: wrap the executor in a RecordingExecutor
+#    `executors = [RecordingExecutor(ExampleScannerExecutor(factory), ResultFixtureWriter('example.fix.gz'))]`
+#    and close the writer when the scan finished. Each result is stored with its delay relative to
+#    the start of the executor's run for that target.
+#
+# REPLAYING
+# ---------
+# Set the `fixture` parameter and start the scan. The `speed` parameter scales the recorded delays
+# (2 = twice as fast, 0 = no delays at all), `latency` adds a fixed delay in milliseconds per target.
+# The result headers of the recorded scanner are taken from the fixture.
+# When the replay is finished the throughput (and with `trackmemory` the peak memory) is printed,
+# which makes runs comparable.
+
+
+class OctoPwnPlugin(OctoPwnSessionRegisterPlugin):
+    def __init__(self):
+        OctoPwnSessionRegisterPlugin.__init__(self, 'SCANNER', 'REPLAY', ReplayScanner)
+
+
+class ReplayScanner(ScannerConsoleBase):
+    def __init__(self, projectid, client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params = None, history = None):
+        # the targets come from the fixture and nothing is authenticated, so there are no target or credential parameters
+        default_params = ScanParameterCollection(
+                ScanParameter('fixture', str, 'Fixture file to replay', required=True, advanced=False),
+                ScanParameter('speed', str, 'Replay speed multiplier for the recorded delays. 0 means no delays', default='1', required=False, advanced=False),
+                ScanParameter('latency', int, 'Extra delay per target in milliseconds', default=0, required=False, advanced=False),
+                ScanParameter('workers', int, 'Number of targets replayed in parallel', default=100, required=False, advanced=True),
+                ScanParameter('trackmemory', strbool, 'Measure the peak memory usage of the replay', default=False, required=False, advanced=True),
+                # the headers of the result table, overwritten with the headers of the recorded scanner when the replay starts
+                ScanParameter('resultheaders', strlist, 'Result table headers', default=['SERVERIP', 'RESULT'], required=False, advanced=True),
+            )
+        ScannerConsoleBase.__init__(self, projectid,  'SCANNER', 'REPLAY', client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params, history, default_params=default_params)
+
+        self.enumerator = None
+        self.enumerator_task = None
+
+        self.help_groups['COMMANDS'] = {
+            'RECORD' : {'record':0,},
+        }
+
+    async def stop(self):
+        try:
+            if self.enumerator is not None:
+                await self.enumerator.stop()
+            if self.enumerator_task is not None:
+                self.enumerator_task.cancel()
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_record(self, sid:str, filepath:str):
+        """Records the results of the last scan of a scanner session into a fixture file"""
+        try:
+            if sid not in self.octopwnobj.sessions and sid.isdigit() is True:
+                sid = int(sid)
+            session = self.octopwnobj.sessions[sid]
+            historyentry, err = await session.do_getlasthistory()
+            if err is not None:
+                raise err
+            if historyentry is None:
+                raise Exception('Session %s has no scan history' % sid)
+
+            writer = ResultFixtureWriter(filepath, session.subtype, historyentry.parameters.flatten().get('resultheaders'))
+            try:
+                for result in historyentry.results:
+                    if getattr(result, 'resid', None) is None:
+                        raise Exception('Result without target in the history of session %s: %r' % (sid, result))
+                    writer.write_result(result.resid, 0, result)
+            finally:
+                writer.close()
+            await self.print(f'[+] Recorded {writer.count} results to {filepath}')
+            return writer.count, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def __monitor_queue(self, h_token = None, h_clientid = None):
+        try:
+            trackmemory = str(self.params.getvalue('trackmemory')).lower() in ['1', 'true']
+            if trackmemory is True:
+                tracemalloc.start()
+            start = time.monotonic()
+            results = 0
+            async for result in self.enumerator.scan():
+                if asyncio.current_task().cancelled():
+                    break
+
+                tid, err = await self.process_uniscan_result(result, h_token = h_token, h_clientid = h_clientid)
+                if err is not None:
+                    raise err
+
+                if result.type in [ScannerResultType.DATA, ScannerResultType.ERROR]:
+                    results += 1
+
+            elapsed = time.monotonic() - start
+            await self.print(f'[+] Replayed {results} results in {elapsed:.3f}s ({results / elapsed if elapsed > 0 else 0:.1f} results/s)')
+            if trackmemory is True:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                await self.print(f'[+] Peak memory: {peak / 1024:.1f} KiB')
+
+            await self.do_stop(True)
+            return True, None
+        except asyncio.CancelledError:
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+        finally:
+            if tracemalloc.is_tracing() is True:
+                tracemalloc.stop()
+
+    async def scan(self, h_token = None, h_clientid = None):
+        """Start replay"""
+        try:
+            header, targets = ResultFixtureReader.load(self.params.getvalue('fixture'))
+            await self.print(f'[+] Loaded fixture of {header.get("scanner")} scanner with {len(targets)} targets')
+            if header.get('resultheaders') is not None:
+                self.params.setvalue('resultheaders', header['resultheaders'])
+
+            rclasses = set([x[2] for tresults in targets.values() for x in tresults if x[1] == 'DATA'])
+            for rclass in sorted(rclasses - set(RESULT_CLASSES.keys()), key = str):
+                await self.print(f'[!] Result class {rclass} is not registered, its results are replayed as recorded text')
+
+            executor = ReplayExecutor(
+                targets,
+                RESULT_CLASSES,
+                float(self.params.getvalue('speed')),
+                int(self.params.getvalue('latency')) / 1000,
+            )
+            # the replay does not touch the network, so the host timeout of the scanner core is disabled (0 -> None)
+            self.enumerator = UniScanner('REPLAY', [executor], [UniTargetGen.from_list(list(targets.keys()))], worker_count = int(self.params.getvalue('workers')), host_timeout = 0)
+            if self.enumerator.host_timeout is not None:
+                raise Exception('The scanner core did not disable the host timeout (%s)' % self.enumerator.host_timeout)
+            self.enumerator_task = asyncio.create_task(self.__monitor_queue(h_token, h_clientid))
+            await self.print('[+] Replay started!')
+
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
@@ -0,0 +1,579 @@
+import asyncio
+import copy
+import time
+from octopwn.common.plugins import OctoPwnSessionRegisterPlugin
+
+from octopwn.clients.scannerbase import ScannerConsoleBase
+from octopwn.common.scanparams import InfoScanParameter, strlist, strbool, ScanParameter, ScanParameterCollection, CredentialedSMBScannerBaseParameters
+from asysocks.unicomm.common.scanner.common import *
+from asysocks.unicomm.common.scanner.scanner import UniScanner
+from asysocks.unicomm.common.scanner.targetgen import UniTargetGen
+from plugins.common.timing import RTTTracker
+from plugins.common.results import register_result_class
+from plugins.common.fixtures import FixtureWriter, FixtureReader, RecordingProxy, ReplayProxy
+
+from aiosmb.connection import SMBConnectionStatus
+from aiosmb.commons.interfaces.share import SMBShare
+from aiosmb.dcerpc.v5.interfaces.remoteregistry import RRPRPC
+from aiosmb.dcerpc.v5.interfaces.servicemanager import REMSVCRPC
+
+# =====================================================================
+# CREDENTIAL x TARGET ADMIN MATRIX
+# =====================================================================
+# The built-in SMBADMIN scanner checks ONE credential against a target range.
+# Checking 50 credentials means 50 scans, and every scan redoes the TCP connection
+# and the SMB negotiation with every single host.
+#
+# This scanner takes a list of credential IDs instead. For each host it:
+# 1. connects and negotiates ONCE
+# 2. performs a session setup (authentication) for each credential on the same connection
+# 3. checks admin access (ADMIN$ share, service manager, remote registry)
+# 4. logs off the session and moves on to the next credential
+#
+# The result is one row per host, listing which credentials are admin on it.
+# The full host x credential table is available via the `matrix` command after the scan.
+#
+# NOTE: the scanner core limits the runtime of the executor per host, and with this scanner
+# the limit covers ALL credentials tested against the host. Raise the timeout accordingly.
+#
+# ADAPTIVE TIMING
+# ---------------
+# A handful of dead or filtered hosts would otherwise hold every worker until the host timeout.
+# The executor measures the round-trip time of the TCP connection to each responding host and
+# derives the connect/negotiate timeout from it (smoothed RTT + 4 * RTT variance, as TCP does).
+# Hosts without samples yet use the network-wide estimate, or `initialtimeout` before the first sample.
+# Hosts that time out are not retried immediately, they are put in a deferred queue which is only
+# processed after the main sweep, with fewer workers and a doubled timeout for each attempt.
+# The host timeout of the scan applies to the retries as well.
+#
+# RECORD AND REPLAY
+# -----------------
+# To compare changes of the executor or of the timing parameters offline, on the same network:
+# - set `recordfile` and run a normal scan. Every call the executor makes on its connections
+#   (connect, negotiate, authenticate, check_admin, logoff, disconnect) is recorded with its
+#   outcome and duration, per host and credential. The recording ends with the scan.
+# - set `replayfile` to the recorded file and run the scan again. No connection is made, the
+#   recorded calls are replayed (see plugins/common/fixtures.py) while the executor, the adaptive
+#   timing, the deferred retries and the result processing run for real. The targets, the number
+#   of workers and the host timeout are taken from the recording, the `credentials` must have been
+#   recorded. `replayspeed` scales the recorded durations (0 = no delays), `replaylatency` adds a
+#   fixed delay in milliseconds to every call.
+
+
+class OctoPwnPlugin(OctoPwnSessionRegisterPlugin):
+    def __init__(self):
+        OctoPwnSessionRegisterPlugin.__init__(self, 'SCANNER', 'SMBADMINMATRIX', SMBAdminMatrixScanner)
+
+
+# Result of a single credential tested against a single host
+class SMBAdminMatrixEntry:
+    def __init__(self, auth:bool, share:bool = False, servicemgr:bool = False, registry:bool = False, error:str = None):
+        self.auth = auth
+        self.share = share
+        self.servicemgr = servicemgr
+        self.registry = registry
+        self.error = error
+
+    def is_admin(self):
+        return self.share is True or self.servicemgr is True or self.registry is True
+
+    # authenticated, but the admin checks could not be completed
+    def is_error(self):
+        return self.auth is True and self.is_admin() is False and self.error is not None
+
+    # compact one-character status used in the matrix table
+    # A = admin, U = authenticated but not admin, E = authenticated but the admin checks failed,
+    # F = authentication failed (or the credential could not be tested, see the error)
+    def to_status(self):
+        if self.auth is False:
+            return 'F'
+        if self.is_admin() is True:
+            return 'A'
+        if self.is_error() is True:
+            return 'E'
+        return 'U'
+
+    def to_dict(self):
+        return {
+            'auth' : self.auth,
+            'share' : self.share,
+            'service' : self.servicemgr,
+            'registry' : self.registry,
+            'error' : self.error,
+        }
+
+    @staticmethod
+    def from_dict(d:dict):
+        return SMBAdminMatrixEntry(d['auth'], d['share'], d['service'], d['registry'], d['error'])
+
+# One result per host, holding the outcome of every credential tested against it
+# registered so the REPLAY scanner can rebuild it from a recorded fixture
+@register_result_class
+class SMBAdminMatrixResult:
+    def __init__(self, entries:dict):
+        # credential ID -> SMBAdminMatrixEntry
+        self.entries = entries
+
+    def get_admin(self):
+        return [cid for cid in self.entries if self.entries[cid].is_admin() is True]
+
+    def get_authonly(self):
+        return [cid for cid in self.entries if self.entries[cid].to_status() == 'U']
+
+    def get_failed(self):
+        return [cid for cid in self.entries if self.entries[cid].auth is False]
+
+    def get_errors(self):
+        return [cid for cid in self.entries if self.entries[cid].is_error() is True]
+
+    def to_line(self, separator = '\t'):
+        return separator.join([
+            ','.join(self.get_admin()),
+            ','.join(self.get_authonly()),
+            ','.join(self.get_failed()),
+            ','.join(self.get_errors()),
+        ])
+
+    def to_dict(self):
+        return {
+            'admin' : self.get_admin(),
+            'authonly' : self.get_authonly(),
+            'failed' : self.get_failed(),
+            'errors' : self.get_errors(),
+            'credentials' : {cid: self.entries[cid].to_dict() for cid in self.entries},
+        }
+
+    @staticmethod
+    def from_dict(d:dict):
+        return SMBAdminMatrixResult({cid: SMBAdminMatrixEntry.from_dict(d['credentials'][cid]) for cid in d['credentials']})
+
+# The network operations of the executor on one SMB connection. Every method returns (result, err),
+# this is the boundary where the connection-level recording and replay happens (see RECORD AND REPLAY)
+class SMBAdminMatrixConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        # the session setup modifies these, they are restored before authenticating with the next credential
+        self.negotiated_state = None
+
+    @property
+    def closed(self):
+        return self.connection.status == SMBConnectionStatus.CLOSED
+
+    async def connect(self):
+        return await self.connection.connect()
+
+    async def negotiate(self):
+        _, err = await self.connection.negotiate()
+        if err is not None:
+            return None, err
+        self.negotiated_state = (self.connection.signing_required, self.connection.PreauthIntegrityHashValue)
+        return True, None
+
+    def __reset_session(self, gssapi):
+        # drops all per-session state from the connection while keeping the negotiated transport
+        connection = self.connection
+        signing_required, preauth_hash = self.negotiated_state
+        connection.gssapi = gssapi
+        connection.original_gssapi = copy.deepcopy(gssapi)
+        connection.signing_required = signing_required
+        connection.PreauthIntegrityHashValue = preauth_hash
+        connection.SessionId = 0
+        connection.SessionKey = None
+        connection.SigningKey = None
+        connection.ApplicationKey = None
+        connection.EncryptionKey = None
+        connection.DecryptionKey = None
+        connection.session_closed = False
+        connection.TreeConnectTable_id = {}
+        connection.TreeConnectTable_share = {}
+        connection.FileHandleTable = {}
+        # the state negotiate() leaves the connection in. In NEGOTIATING state sendSMB would not
+        # set the SessionId in the header, and the second message of the NTLM exchange would fail
+        connection.status = SMBConnectionStatus.SESSIONSETUP
+
+    async def authenticate(self, cid, factory):
+        """Session setup with the credential of `factory`, `cid` identifies the credential in recordings"""
+        try:
+            self.__reset_session(factory.get_credential())
+        except Exception as e:
+            return None, e
+        return await self.connection.session_setup()
+
+    async def check_admin(self):
+        """Returns (share access, service manager access, registry access)"""
+        try:
+            connection = self.connection
+            # share names are case-insensitive, one tree connect is enough
+            share = SMBShare(
+                name = 'ADMIN$',
+                fullpath = '\\\\%s\\ADMIN$' % connection.target.get_hostname_or_ip()
+            )
+            _, err = await share.connect(connection)
+            share_access = err is None
+
+            # the RPC handles are closed right away, the IPC$ tree is disconnected by logoff
+            rpc, err = await RRPRPC.from_smbconnection(connection)
+            registry_access = err is None
+            if registry_access is True:
+                await rpc.close()
+
+            rpc, err = await REMSVCRPC.from_smbconnection(connection)
+            service_access = err is None
+            if service_access is True:
+                await rpc.close()
+
+            return (share_access, service_access, registry_access), None
+        except Exception as e:
+            return None, e
+
+    async def logoff(self):
+        # tree_disconnect and logoff return the error instead of raising it
+        # a failed tree disconnect is not fatal, the logoff drops every tree of the session
+        for tree_id in list(self.connection.TreeConnectTable_id.keys()):
+            _, err = await self.connection.tree_disconnect(tree_id)
+            if err is not None:
+                break
+        return await self.connection.logoff()
+
+    async def disconnect(self):
+        try:
+            await self.connection.disconnect()
+            return True, None
+        except Exception as e:
+            return None, e
+
+# the methods of SMBAdminMatrixConnection which are recorded and replayed, and the state kept with them
+CONNECTION_METHODS = ['connect', 'negotiate', 'authenticate', 'check_admin', 'logoff', 'disconnect']
+CONNECTION_STATE = ['closed']
+
+FIXTURE_KIND = 'SMBADMINMATRIX'
+
+def recording_connection_factory(factories:dict, writer:FixtureWriter):
+    """Connection factory for the executor, recording every call made on the connections"""
+    firstfactory = factories[next(iter(factories))]
+    def create_connection(target):
+        connection = SMBAdminMatrixConnection(firstfactory.create_connection_newtarget(target))
+        return RecordingProxy(connection, writer, str(target), CONNECTION_METHODS, CONNECTION_STATE)
+    return create_connection
+
+def replay_connection_factory(targets:dict, speed:float = 1.0, latency:float = 0):
+    """Connection factory for the executor, replaying the recorded calls. `targets` maps targets to their records"""
+    calls = {target : ReplayProxy.index(targets[target]) for target in targets}
+    def create_connection(target):
+        return ReplayProxy(calls.get(str(target), {}), CONNECTION_METHODS, speed, latency, {'closed' : False})
+    return create_connection
+
+class SMBAdminMatrixExecutor:
+    def __init__(self, factories:dict, timing:RTTTracker = None, retries:int = 0, retryworkers:int = 10, hosttimeout:float = None, connection_factory = None):
+        # credential ID -> SMBConnectionFactory
+        self.factories = factories
+        # if timing is None no per-connection timeout is applied, only the host timeout of the scanner core
+        self.timing = timing
+        self.retries = retries
+        self.retryworkers = retryworkers
+        # the deferred retries run outside of the scanner core, so its host timeout is applied here. None means no limit
+        self.hosttimeout = hosttimeout
+        # target -> object with the methods of SMBAdminMatrixConnection, used for recording and replaying
+        # None means a new SMBAdminMatrixConnection from the factory of the first credential
+        self.connection_factory = connection_factory
+        # (targetid, target, attempt) of hosts that timed out, processed after the main sweep
+        self.deferred = []
+
+    def create_connection(self, target):
+        if self.connection_factory is not None:
+            return self.connection_factory(target)
+        firstfactory = self.factories[next(iter(self.factories))]
+        return SMBAdminMatrixConnection(firstfactory.create_connection_newtarget(target))
+
+    async def __negotiate(self, connection, target, attempt):
+        timeout = None
+        if self.timing is not None:
+            timeout = self.timing.get_timeout(str(target), attempt)
+        start = time.monotonic()
+        _, err = await asyncio.wait_for(connection.connect(), timeout)
+        if err is not None:
+            raise err
+        if self.timing is not None:
+            self.timing.update(str(target), time.monotonic() - start)
+        _, err = await asyncio.wait_for(connection.negotiate(), timeout)
+        if err is not None:
+            raise err
+
+    async def run(self, targetid, target, out_queue, attempt = 0):
+        try:
+            entries = {}
+            connection = self.create_connection(target)
+            try:
+                await self.__negotiate(connection, target, attempt)
+                for cid in self.factories:
+                    # an error with one credential must not throw away the results of the others,
+                    # so errors are recorded per credential and the next credential is tested
+                    try:
+                        if connection.closed is True:
+                            # some servers drop the connection after a failed authentication
+                            # in this case we have no choice but to negotiate again
+                            connection = self.create_connection(target)
+                            await self.__negotiate(connection, target, attempt)
+
+                        _, err = await connection.authenticate(cid, self.factories[cid])
+                        if err is not None:
+                            entries[cid] = SMBAdminMatrixEntry(False, error = str(err))
+                            continue
+                    except Exception as e:
+                        entries[cid] = SMBAdminMatrixEntry(False, error = str(e) or type(e).__name__)
+                        continue
+
+                    access, err = await connection.check_admin()
+                    if err is not None:
+                        entries[cid] = SMBAdminMatrixEntry(True, error = str(err) or type(err).__name__)
+                    else:
+                        share_access, service_access, registry_access = access
+                        entries[cid] = SMBAdminMatrixEntry(True, share_access, service_access, registry_access)
+                    _, err = await connection.logoff()
+                    if err is not None:
+                        # the session may still be alive on the server, authenticating the next credential
+                        # on top of it is not reliable. The connection is closed and renegotiated instead.
+                        await connection.disconnect()
+            finally:
+                # every session has been logged off already, only the transport needs to be closed.
+                # an error here must not replace the original exception (e.g. a timeout that defers the host)
+                try:
+                    await connection.disconnect()
+                except Exception:
+                    pass
+
+            await out_queue.put(ScannerData(target, SMBAdminMatrixResult(entries)))
+        except asyncio.TimeoutError:
+            if attempt < self.retries:
+                self.deferred.append((targetid, target, attempt + 1))
+                return
+            await out_queue.put(ScannerError(target, Exception('Connection timed out')))
+        except Exception as e:
+            await out_queue.put(ScannerError(target, e))
+            return
+
+    async def run_deferred(self, out_queue):
+        """Retries the hosts which timed out during the main sweep. Hosts timing out again are deferred again until the retries are exhausted"""
+        while len(self.deferred) > 0:
+            deferred = self.deferred
+            self.deferred = []
+            semaphore = asyncio.Semaphore(self.retryworkers)
+            async def retry(targetid, target, attempt):
+                async with semaphore:
+                    try:
+                        await asyncio.wait_for(self.run(targetid, target, out_queue, attempt), self.hosttimeout)
+                    except asyncio.TimeoutError as e:
+                        # same as the scanner core does when the host timeout is hit
+                        await out_queue.put(ScannerError(target, e))
+            await asyncio.gather(*[retry(*x) for x in deferred])
+
+class SMBAdminMatrixScanner(ScannerConsoleBase):
+    def __init__(self, projectid, client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params = None, history = None):
+        default_params = ScanParameterCollection(
+                CredentialedSMBScannerBaseParameters(
+                    resultheaders = ['SERVERIP', 'ADMIN', 'AUTHONLY', 'FAILED', 'ERROR'],
+                    info='Checks a list of credentials for admin access against the targets, negotiating only once per host',
+                ),
+                # comma separated list of credential IDs, e.g. `1,2,5`
+                ScanParameter('credentials', strlist, 'Credential IDs to test', required=True, advanced=False),
+                # adaptive timing, see the description at the top of the file
+                ScanParameter('adaptivetimeout', strbool, 'Derive the connection timeout from the measured RTT', default=True, required=False, advanced=True),
+                ScanParameter('initialtimeout', int, 'Connection timeout in seconds before any RTT was measured', default=3, required=False, advanced=True),
+                ScanParameter('mintimeout', int, 'Minimum connection timeout in seconds', default=1, required=False, advanced=True),
+                ScanParameter('maxtimeout', int, 'Maximum connection timeout in seconds', default=10, required=False, advanced=True),
+                ScanParameter('retries', int, 'Number of deferred retries for hosts that timed out', default=1, required=False, advanced=True),
+                ScanParameter('retryworkers', int, 'Number of hosts retried in parallel after the main sweep', default=10, required=False, advanced=True),
+                # record and replay, see the description at the top of the file
+                ScanParameter('recordfile', str, 'Record the connection-level calls of the scan to this fixture file', default='', required=False, advanced=True),
+                ScanParameter('replayfile', str, 'Replay a recorded fixture file instead of scanning the network', default='', required=False, advanced=True),
+                ScanParameter('replayspeed', str, 'Replay speed multiplier for the recorded durations. 0 means no delays', default='1', required=False, advanced=True),
+                ScanParameter('replaylatency', int, 'Extra delay per replayed call in milliseconds', default=0, required=False, advanced=True),
+            )
+        ScannerConsoleBase.__init__(self, projectid,  'SCANNER', 'SMBADMINMATRIX', client_id, connection, cmd_q, msg_queue, prompt, octopwnobj, params, history, default_params=default_params)
+
+        self.enumerator = None
+        self.enumerator_task = None
+        self.executor = None
+        # FixtureWriter of the running scan if `recordfile` is set
+        self.recorder = None
+        # target -> {credential ID -> status}
+        self.matrix = {}
+        self.matrix_cids = []
+
+        self.help_groups['COMMANDS'] = {
+            'MATRIX' : {'matrix':0,},
+        }
+
+    async def stop(self):
+        try:
+            if self.enumerator is not None:
+                await self.enumerator.stop()
+            if self.enumerator_task is not None:
+                self.enumerator_task.cancel()
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def do_matrix(self):
+        """Prints the host x credential admin matrix of the last scan (A = admin, U = authenticated, E = admin check error, F = failed)"""
+        try:
+            await self.print('\t'.join(['SERVERIP'] + self.matrix_cids))
+            for target in self.matrix:
+                await self.print('\t'.join([str(target)] + [self.matrix[target].get(cid, '-') for cid in self.matrix_cids]))
+            return self.matrix, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+
+    async def __create_enumerator(self, cids, executor_factory):
+        # the credentialed factory (and scanner) is created from the 'credential' parameter,
+        # so it is set to each credential ID in turn. The parameter is saved in the session file,
+        # so the original value (even if empty) is restored exactly when done.
+        factories = {}
+        original_cid = self.params.getvalue('credential')
+        try:
+            for cid in cids:
+                self.params.setvalue('credential', cid)
+                factory, err = await self.create_credentialed_factory()
+                if err is not None:
+                    raise err
+                factories[cid] = factory
+
+            self.params.setvalue('credential', cids[0])
+            executor = executor_factory(factories)
+            enumerator, err = await self.create_credentialed_scanner([executor])
+            if err is not None:
+                raise err
+            return executor, enumerator
+        finally:
+            self.params.setvalue('credential', original_cid)
+
+    async def __create_replay(self, cids, executor_factory):
+        # the recorded targets are scanned with the recorded scanner core settings
+        header, records = FixtureReader.load(self.params.getvalue('replayfile'), FIXTURE_KIND)
+        missing = [cid for cid in cids if cid not in header['credentials']]
+        if len(missing) > 0:
+            raise Exception('Credential ID(s) %s not recorded in the fixture (recorded: %s)' % (', '.join(missing), ', '.join(header['credentials'])))
+        targets = FixtureReader.group(records)
+        # nothing is authenticated, the recorded session setups are replayed instead
+        executor = executor_factory({cid : None for cid in cids})
+        executor.connection_factory = replay_connection_factory(
+            targets,
+            float(self.params.getvalue('replayspeed')),
+            int(self.params.getvalue('replaylatency')) / 1000,
+        )
+        enumerator = UniScanner(
+            'SMBADMINMATRIX',
+            [executor],
+            [UniTargetGen.from_list(list(targets.keys()))],
+            worker_count = header['workers'],
+            host_timeout = header['hosttimeout'] if header['hosttimeout'] is not None else 0,
+        )
+        await self.print(f'[+] Replaying {len(records)} recorded calls of {len(targets)} targets')
+        return executor, enumerator
+
+    async def __process_result(self, result, h_token = None, h_clientid = None):
+        tid, err = await self.process_uniscan_result(result, h_token = h_token, h_clientid = h_clientid)
+        if err is not None:
+            raise err
+
+        if result.type == ScannerResultType.DATA:
+            entries = result.data.entries
+            self.matrix[str(result.resid)] = {cid: entries[cid].to_status() for cid in entries}
+            admins = result.data.get_admin()
+            if len(admins) > 0:
+                await self.print(f'[+] {result.resid} - admin with credential(s): {", ".join(admins)}')
+
+    async def __process_deferred(self, h_token = None, h_clientid = None):
+        if len(self.executor.deferred) == 0:
+            return
+        await self.print(f'[+] Main sweep done, retrying {len(self.executor.deferred)} hosts that timed out')
+        retry_queue = asyncio.Queue()
+        retry_task = asyncio.create_task(self.executor.run_deferred(retry_queue))
+        try:
+            while retry_task.done() is False or retry_queue.qsize() > 0:
+                try:
+                    result = await asyncio.wait_for(retry_queue.get(), timeout = 1)
+                except asyncio.TimeoutError:
+                    continue
+                await self.__process_result(result, h_token, h_clientid)
+        finally:
+            retry_task.cancel()
+
+    async def __monitor_queue(self, h_token = None, h_clientid = None):
+        try:
+            async for result in self.enumerator.scan():
+                if asyncio.current_task().cancelled():
+                    break
+
+                if result.type == ScannerResultType.FINISHED:
+                    # the deferred retries must be processed before the scan is marked as finished
+                    await self.__process_deferred(h_token, h_clientid)
+
+                await self.__process_result(result, h_token, h_clientid)
+
+            await self.do_stop(True)
+            return True, None
+        except asyncio.CancelledError:
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+                await self.print(f'[+] Recorded {self.recorder.count} calls to {self.recorder.filepath}')
+                self.recorder = None
+
+    async def scan(self, h_token = None, h_clientid = None):
+        """Start enumeration"""
+        try:
+            cids = [str(cid).strip() for cid in self.params.getvalue('credentials') if str(cid).strip() != '']
+            if len(cids) == 0:
+                raise Exception('No credential IDs specified in the "credentials" parameter')
+            recordfile = str(self.params.getvalue('recordfile') or '').strip()
+            replayfile = str(self.params.getvalue('replayfile') or '').strip()
+            if recordfile != '' and replayfile != '':
+                raise Exception('The "recordfile" and "replayfile" parameters can not be used together')
+            if replayfile == '':
+                for cid in cids:
+                    if cid not in self.octopwnobj.credentials and (cid.isdigit() is False or int(cid) not in self.octopwnobj.credentials):
+                        raise Exception('Credential ID %s not found' % cid)
+
+            self.matrix = {}
+            self.matrix_cids = cids
+
+            timing = None
+            if str(self.params.getvalue('adaptivetimeout')).lower() in ['1', 'true']:
+                timing = RTTTracker(
+                    float(self.params.getvalue('initialtimeout')),
+                    float(self.params.getvalue('mintimeout')),
+                    float(self.params.getvalue('maxtimeout')),
+                )
+            retries = int(self.params.getvalue('retries'))
+            retryworkers = int(self.params.getvalue('retryworkers'))
+            executor_factory = lambda factories: SMBAdminMatrixExecutor(factories, timing, retries, retryworkers)
+            if replayfile != '':
+                self.executor, self.enumerator = await self.__create_replay(cids, executor_factory)
+            else:
+                self.executor, self.enumerator = await self.__create_enumerator(cids, executor_factory)
+            if recordfile != '':
+                # the scanner core settings are recorded as well, the replay uses the same ones
+                self.recorder = FixtureWriter(
+                    recordfile,
+                    FIXTURE_KIND,
+                    credentials = cids,
+                    workers = self.enumerator.worker_count,
+                    hosttimeout = self.enumerator.host_timeout,
+                )
+                self.executor.connection_factory = recording_connection_factory(self.executor.factories, self.recorder)
+            # the deferred retries are limited by the same host timeout as the main sweep
+            self.executor.hosttimeout = self.enumerator.host_timeout
+            self.enumerator_task = asyncio.create_task(self.__monitor_queue(h_token, h_clientid))
+            await self.print('[+] Scan started!')
+
+            return True, None
+        except Exception as e:
+            await self.print_exc(e)
+            return None, e
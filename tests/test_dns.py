@@ -0,0 +1,112 @@
+import asyncio
+import socket
+import struct
+
+from plugins.common.dns import DNSCache, DNSUDPClient, BulkResolver
+
+
+A_RECORDS = {'dc.north.local' : '192.168.56.11'}
+PTR_RECORDS = {'11.56.168.192.in-addr.arpa' : 'dc.north.local'}
+
+
+# Minimal authoritative stub server answering from the tables above, NXDOMAIN for everything else
+class StubDNSServer(asyncio.DatagramProtocol):
+    def __init__(self, delay:float = 0):
+        self.delay = delay
+        self.queries = []
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.get_running_loop().create_task(self.reply(data, addr))
+
+    async def reply(self, data, addr):
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        self.inflight -= 1
+        txid = data[:2]
+        name, pos = DNSUDPClient.decode_name(data, 12)
+        qtype, = struct.unpack('!H', data[pos:pos+2])
+        self.queries.append((name, qtype))
+        question = data[12:pos+4]
+        answer = None
+        if qtype == 1 and name in A_RECORDS:
+            answer = struct.pack('!HHHIH', 0xC00C, 1, 1, 120, 4) + socket.inet_aton(A_RECORDS[name])
+        elif qtype == 12 and name in PTR_RECORDS:
+            rdata = DNSUDPClient.encode_name(PTR_RECORDS[name])
+            answer = struct.pack('!HHHIH', 0xC00C, 12, 1, 120, len(rdata)) + rdata
+        if answer is None:
+            self.transport.sendto(txid + struct.pack('!HHHHH', 0x8183, 1, 0, 0, 0) + question, addr)
+        else:
+            self.transport.sendto(txid + struct.pack('!HHHHH', 0x8180, 1, 1, 0, 0) + question + answer, addr)
+
+
+async def start_stub(delay:float = 0):
+    server = StubDNSServer(delay)
+    transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: server, local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    return server, transport, DNSUDPClient.from_string('127.0.0.1:%s' % port, timeout=1)
+
+
+def test_forward_and_reverse():
+    async def run():
+        server, transport, client = await start_stub()
+        try:
+            resolver = BulkResolver(DNSCache(), client)
+            assert await resolver.forward('dc.north.local') == ('192.168.56.11', None)
+            assert await resolver.reverse('192.168.56.11') == ('dc.north.local', None)
+            assert await resolver.forward('missing.north.local') == (None, None)
+        finally:
+            transport.close()
+    asyncio.run(run())
+
+def test_cache_and_negative_cache():
+    async def run():
+        server, transport, client = await start_stub()
+        try:
+            cache = DNSCache()
+            resolver = BulkResolver(cache, client, negativettl = 60)
+            for _ in range(3):
+                await resolver.forward('dc.north.local')
+                await resolver.forward('missing.north.local')
+            assert len(server.queries) == 2
+            assert cache.to_dict()['negative'] == 1
+
+            # a zero negative TTL must not keep the failure cached
+            resolver = BulkResolver(DNSCache(), client, negativettl = 0)
+            await resolver.forward('missing.north.local')
+            await resolver.forward('missing.north.local')
+            assert len(server.queries) == 4
+        finally:
+            transport.close()
+    asyncio.run(run())
+
+def test_concurrent_lookups_are_merged_and_bounded():
+    async def run():
+        server, transport, client = await start_stub(delay = 0.05)
+        try:
+            resolver = BulkResolver(DNSCache(), client, maxinflight = 2)
+            queries = [('192.168.56.11', 'PTR')] * 10 + [('dc.north.local', 'A')] * 10 + [('host%d.north.local' % i, 'A') for i in range(4)]
+            results = await resolver.resolve_many(queries)
+            assert results[0] == ('dc.north.local', None)
+            assert results[10] == ('192.168.56.11', None)
+            assert results[-1] == (None, None)
+            # duplicate lookups are merged into a single query
+            assert len(server.queries) == 6
+            assert server.max_inflight == 2
+        finally:
+            transport.close()
+    asyncio.run(run())
+
+def test_nameserver_parsing():
+    client = DNSUDPClient.from_string('10.0.0.1')
+    assert (client.ip, client.port) == ('10.0.0.1', 53)
+    client = DNSUDPClient.from_string('127.0.0.1:5353')
+    assert (client.ip, client.port) == ('127.0.0.1', 5353)
+    client = DNSUDPClient.from_string('[::1]:5353')
+    assert (client.ip, client.port) == ('::1', 5353)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('octopwn')
+
+from octopwn.common.target import Target
+from plugins.intermediate.dnsresolver import DNSResolverUtil
+from test_dns import start_stub
+
+
+class FakeParams:
+    def __init__(self, values:dict):
+        self.values = values
+
+    def getvalue(self, name):
+        return self.values[name]
+
+    def setvalue(self, name, value):
+        self.values[name] = value
+
+# Only the target store of the core, updates go through update_target
+class FakeOctoPwn:
+    def __init__(self, targets:dict):
+        self.targets = targets
+        self.updates = []
+
+    async def update_target(self, tid, target):
+        self.updates.append(tid)
+        self.targets[tid] = target
+        return tid, None
+
+def create_util(octopwnobj, nameserver:str):
+    util = DNSResolverUtil.__new__(DNSResolverUtil)
+    util.octopwnobj = octopwnobj
+    util.params = FakeParams({'nameserver' : nameserver, 'maxinflight' : 2, 'timeout' : 1, 'defaultttl' : 300, 'negativettl' : 60})
+    util.resolver = None
+    util.resolver_config = None
+    util.login_ok = False
+    util.nologon_commands = ['any']
+    util.printed = []
+    async def fake_print(msg):
+        util.printed.append(msg)
+    util.print = fake_print
+    util.print_exc = fake_print
+    return util
+
+
+def test_resolver_is_kept_until_the_parameters_change():
+    util = create_util(FakeOctoPwn({}), '127.0.0.1:53')
+    resolver = util.get_resolver()
+    assert util.get_resolver() is resolver
+    util.params.setvalue('maxinflight', 5)
+    assert util.get_resolver() is not resolver
+
+def test_batch_lookups_share_the_resolver():
+    async def run():
+        server, transport, client = await start_stub(delay = 0.05)
+        try:
+            util = create_util(FakeOctoPwn({}), '127.0.0.1:%s' % client.port)
+            results, err = await util.batch(['resolve dc.north.local'] * 10 + ['reverse 192.168.56.11'] * 10, concurrency = 20)
+            assert err is None
+            assert results[0]['result'] == '192.168.56.11'
+            assert results[-1]['result'] == 'dc.north.local'
+            # duplicate lookups are merged and the in-flight limit applies across the commands
+            assert len(server.queries) == 2
+            assert server.max_inflight <= 2
+        finally:
+            transport.close()
+    asyncio.run(run())
+
+def test_resolvetargets_updates_through_the_core():
+    async def run():
+        server, transport, client = await start_stub()
+        try:
+            octopwnobj = FakeOctoPwn({
+                1 : Target(ip = '192.168.56.11'),
+                2 : Target(hostname = 'dc.north.local'),
+                3 : Target(hostname = 'missing.north.local'),
+            })
+            original = octopwnobj.targets[1]
+            util = create_util(octopwnobj, '127.0.0.1:%s' % client.port)
+            enriched, err = await util.do_resolvetargets()
+            assert err is None
+            assert enriched == 2
+            assert sorted(octopwnobj.updates) == [1, 2]
+            assert octopwnobj.targets[1].hostname == 'dc.north.local'
+            assert octopwnobj.targets[2].ip == '192.168.56.11'
+            # the stored target is replaced through the core, not modified in place
+            assert original.hostname is None
+        finally:
+            transport.close()
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+import asyncio
+import gzip
+import json
+import time
+
+import pytest
+
+from plugins.common.fixtures import FIXTURE_VERSION, FixtureWriter, FixtureReader, RecordingProxy, ReplayProxy, ReplayedError, ReplayMismatchError
+
+
+class FakeResult:
+    def __init__(self, name):
+        self.name = name
+
+    def to_dict(self):
+        return {'name' : self.name}
+
+# a client session, its commands return (result, err)
+class FakeSession:
+    def __init__(self):
+        self.login_ok = False
+
+    async def do_login(self):
+        await asyncio.sleep(0.02)
+        self.login_ok = True
+        return True, None
+
+    async def do_shares(self, path = None):
+        return [FakeResult('C$'), FakeResult('ADMIN$')], None
+
+    async def do_cat(self, path):
+        return None, Exception('access denied to %s' % path)
+
+    async def do_crash(self):
+        raise ValueError('crashed')
+
+    async def do_hang(self):
+        await asyncio.sleep(3600)
+        return True, None
+
+METHODS = ['do_login', 'do_shares', 'do_cat', 'do_crash', 'do_hang']
+
+async def record_session(writer:FixtureWriter):
+    session = RecordingProxy(FakeSession(), writer, '1', METHODS, state = ['login_ok'])
+    await session.do_login()
+    await session.do_shares()
+    await session.do_cat('secret.txt')
+    await session.do_cat('other.txt')
+    with pytest.raises(ValueError):
+        await session.do_crash()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(session.do_hang(), 0.05)
+    return session
+
+
+def test_fixture_roundtrip(tmp_path):
+    filepath = str(tmp_path / 'test.fix.gz')
+    writer = FixtureWriter(filepath, 'test', scanner = 'TEST', workers = 5)
+    writer.write_record(['10.0.0.1', 'connect', None, FakeResult('x')])
+    writer.write_record(['10.0.0.2', 'connect', None, None])
+    writer.write_record(['10.0.0.1', 'logoff', None, ('a', 1)])
+    writer.close()
+    assert writer.count == 3
+
+    header, records = FixtureReader.load(filepath, 'test')
+    assert header == {'scanner' : 'TEST', 'workers' : 5, 'version' : FIXTURE_VERSION, 'kind' : 'test'}
+    # objects with to_dict are stored as their dict, tuples as lists
+    assert records[0] == ['10.0.0.1', 'connect', None, {'name' : 'x'}]
+    assert records[2] == ['10.0.0.1', 'logoff', None, ['a', 1]]
+    assert list(FixtureReader.group(records).keys()) == ['10.0.0.1', '10.0.0.2']
+    assert len(FixtureReader.group(records)['10.0.0.1']) == 2
+
+def test_fixture_version_and_kind_are_checked(tmp_path):
+    filepath = str(tmp_path / 'old.fix.gz')
+    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version' : FIXTURE_VERSION - 1, 'kind' : 'test'}) + '\n')
+    with pytest.raises(Exception, match='Unsupported fixture version'):
+        FixtureReader.load(filepath)
+
+    filepath = str(tmp_path / 'other.fix.gz')
+    FixtureWriter(filepath, 'other').close()
+    with pytest.raises(Exception, match='Fixture of kind other'):
+        FixtureReader.load(filepath, 'test')
+    header, records = FixtureReader.load(filepath)
+    assert header['kind'] == 'other' and records == []
+
+def test_recording_proxy(tmp_path):
+    async def run():
+        filepath = str(tmp_path / 'session.fix.gz')
+        writer = FixtureWriter(filepath, 'session')
+        session = await record_session(writer)
+        # attributes are read from and written to the wrapped session
+        assert session.login_ok is True
+        session.login_ok = False
+        assert session._obj.login_ok is False
+        writer.close()
+
+        _, records = FixtureReader.load(filepath)
+        assert [record[1:3] for record in records] == [
+            ['do_login', None], ['do_shares', None], ['do_cat', 'secret.txt'], ['do_cat', 'other.txt'], ['do_crash', None], ['do_hang', None],
+        ]
+        login, shares, cat, _, crash, hang = records
+        assert login[3] >= 0.02 and login[8] == {'login_ok' : True}
+        assert shares[6] == [{'name' : 'C$'}, {'name' : 'ADMIN$'}]
+        assert cat[7] == ['access denied to secret.txt', "Exception('access denied to secret.txt')"]
+        assert crash[5] is True and crash[7][0] == 'crashed'
+        # cancelled by the timeout of the caller
+        assert hang[4] is True and hang[3] >= 0.05
+    asyncio.run(run())
+
+def test_replay_proxy(tmp_path):
+    async def run():
+        filepath = str(tmp_path / 'session.fix.gz')
+        writer = FixtureWriter(filepath, 'session')
+        await record_session(writer)
+        writer.close()
+        _, records = FixtureReader.load(filepath, 'session')
+
+        session = ReplayProxy(records, METHODS, speed = 0, state = {'login_ok' : False})
+        assert session.login_ok is False
+        assert await session.do_login() == (True, None)
+        assert session.login_ok is True
+        # the recorded JSON is returned, not the original objects
+        assert await session.do_shares() == ([{'name' : 'C$'}, {'name' : 'ADMIN$'}], None)
+        # calls are matched by their first argument
+        _, err = await session.do_cat('other.txt')
+        assert str(err) == 'access denied to other.txt'
+        assert repr(err) == "Exception('access denied to other.txt')"
+        _, err = await session.do_cat('secret.txt')
+        assert str(err) == 'access denied to secret.txt'
+        with pytest.raises(ReplayedError, match='crashed'):
+            await session.do_crash()
+        # a call that hung when recording hangs until the timeout of the caller, every time
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(session.do_hang(), 0.05)
+        # the last record of a call is repeated
+        assert await session.do_login() == (True, None)
+        with pytest.raises(ReplayMismatchError):
+            await session.do_cat('notrecorded.txt')
+        with pytest.raises(AttributeError):
+            session.do_notrecorded
+    asyncio.run(run())
+
+def test_replay_proxy_order_speed_and_latency():
+    async def run():
+        # [key, method, first argument, duration, hung, raised, result, error, state]
+        records = [
+            ['1', 'connect', None, 0.1, False, False, 1, None, {}],
+            ['1', 'connect', None, 0.1, False, False, 2, None, {}],
+        ]
+        calls = ReplayProxy.index(records)
+        # proxies sharing the calls consume the records in recorded order
+        first = ReplayProxy(calls, ['connect'], speed = 2)
+        start = time.monotonic()
+        assert await first.connect() == (1, None)
+        elapsed = time.monotonic() - start
+        assert 0.04 <= elapsed < 0.09
+        second = ReplayProxy(calls, ['connect'], speed = 0, latency = 0.1)
+        start = time.monotonic()
+        assert await second.connect() == (2, None)
+        assert await second.connect() == (2, None)
+        elapsed = time.monotonic() - start
+        assert 0.2 <= elapsed < 0.3
+    asyncio.run(run())
@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+import json
+import time
+
+import pytest
+
+pytest.importorskip('asysocks')
+
+from asysocks.unicomm.common.scanner.common import ScannerResultType, ScannerData, ScannerError, ScannerProgress
+from plugins.common.fixtures import FIXTURE_VERSION
+from plugins.common.results import create_result_class, result_class_name
+from plugins.common.resultreplay import ResultFixtureWriter, ResultFixtureReader, ReplayedResult, RecordingExecutor, ReplayExecutor
+
+
+ReplayTestResult = create_result_class('ReplayTestResult', ['SERVERIP', 'OS', 'VERSION'])
+
+class UnregisteredResult:
+    def to_line(self, separator = '\t'):
+        return separator.join(['a', 'b'])
+
+    def to_dict(self):
+        return {'x' : 'a', 'y' : 'b'}
+
+async def drain(queue:asyncio.Queue):
+    results = []
+    while queue.qsize() > 0:
+        results.append(queue.get_nowait())
+    return results
+
+def write_fixture(filepath):
+    writer = ResultFixtureWriter(filepath, 'TEST', ['SERVERIP', 'OS', 'VERSION'])
+    writer.write_result('10.0.0.1', 0.05, ScannerData('10.0.0.1', ReplayTestResult('Windows', '10')))
+    writer.write_result('10.0.0.1', 0.1, ScannerData('10.0.0.1', UnregisteredResult()))
+    writer.write_result('10.0.0.2', 0, ScannerError('10.0.0.2', ConnectionRefusedError('refused')))
+    # progress and other scanner results are not recorded
+    writer.write_result('10.0.0.2', 0, ScannerProgress('TEST', 2, 1))
+    with pytest.raises(ValueError):
+        writer.write_result('10.0.0.2', 0, 'not a result')
+    writer.close()
+    return writer
+
+
+def test_result_fixture_roundtrip(tmp_path):
+    filepath = str(tmp_path / 'results.fix.gz')
+    writer = write_fixture(filepath)
+    assert writer.count == 3
+
+    header, targets = ResultFixtureReader.load(filepath)
+    assert header['scanner'] == 'TEST'
+    assert header['resultheaders'] == ['SERVERIP', 'OS', 'VERSION']
+    assert list(targets.keys()) == ['10.0.0.1', '10.0.0.2']
+    assert targets['10.0.0.1'][0] == (0.05, 'DATA', result_class_name(ReplayTestResult), 'Windows\t10', {'OS' : 'Windows', 'VERSION' : '10'})
+    assert targets['10.0.0.2'] == [(0, 'ERROR', None, "ConnectionRefusedError('refused')", None)]
+
+def test_result_fixture_version_is_checked(tmp_path):
+    filepath = str(tmp_path / 'old.fix.gz')
+    # the layout of the previous fixture version
+    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version' : 3, 'scanner' : 'TEST', 'resultheaders' : None}) + '\n')
+        f.write(json.dumps(['10.0.0.1', 0, 'ERROR', None, 'x', None]) + '\n')
+    with pytest.raises(Exception, match='Unsupported fixture version 3'):
+        ResultFixtureReader.load(filepath)
+    assert FIXTURE_VERSION != 3
+
+def test_replay_executor_rebuilds_registered_classes(tmp_path):
+    async def run():
+        filepath = str(tmp_path / 'results.fix.gz')
+        write_fixture(filepath)
+        _, targets = ResultFixtureReader.load(filepath)
+        executor = ReplayExecutor(targets, speed = 0)
+        queue = asyncio.Queue()
+        await executor.run(1, '10.0.0.1', queue)
+        await executor.run(2, '10.0.0.2', queue)
+        await executor.run(3, '10.0.0.3', queue)
+        registered, unregistered, error = await drain(queue)
+
+        # rebuilt with from_dict, so the replay runs the real to_line/to_dict
+        assert type(registered.data) is ReplayTestResult
+        assert registered.data.OS == 'Windows'
+        assert registered.data.to_line(',') == 'Windows,10'
+        # classes which are not registered are replayed as their recorded output
+        assert type(unregistered.data) is ReplayedResult
+        assert unregistered.data.to_line(',') == 'a,b'
+        assert unregistered.data.to_dict() == {'x' : 'a', 'y' : 'b'}
+        # the recorded error text is kept as is
+        assert error.type == ScannerResultType.ERROR
+        assert error.data == "ConnectionRefusedError('refused')"
+        assert error.to_line() == "ERROR\t10.0.0.2\tConnectionRefusedError('refused')"
+    asyncio.run(run())
+
+def test_replay_executor_speed_and_latency():
+    async def run():
+        targets = {'10.0.0.1' : [(0.1, 'ERROR', None, 'a', None), (0.2, 'ERROR', None, 'b', None)]}
+
+        async def timed(executor):
+            queue = asyncio.Queue()
+            start = time.monotonic()
+            await executor.run(1, '10.0.0.1', queue)
+            assert [res.data for res in await drain(queue)] == ['a', 'b']
+            return time.monotonic() - start
+
+        assert 0.2 <= await timed(ReplayExecutor(targets, {}, speed = 1)) < 0.3
+        assert 0.1 <= await timed(ReplayExecutor(targets, {}, speed = 2)) < 0.15
+        assert await timed(ReplayExecutor(targets, {}, speed = 0)) < 0.05
+        assert 0.1 <= await timed(ReplayExecutor(targets, {}, speed = 0, latency = 0.1)) < 0.15
+    asyncio.run(run())
+
+def test_recording_executor(tmp_path):
+    async def run():
+        class SlowExecutor:
+            async def run(self, targetid, target, out_queue):
+                await asyncio.sleep(0.05)
+                await out_queue.put(ScannerData(target, ReplayTestResult('Linux', '6')))
+                await out_queue.put(ScannerProgress('TEST', 1, 1))
+
+        filepath = str(tmp_path / 'recorded.fix.gz')
+        writer = ResultFixtureWriter(filepath, 'TEST')
+        executor = RecordingExecutor(SlowExecutor(), writer)
+        queue = asyncio.Queue()
+        await executor.run(1, '10.0.0.1', queue)
+        writer.close()
+        # every result is passed on, only the results are recorded
+        assert [res.type for res in await drain(queue)] == [ScannerResultType.DATA, ScannerResultType.PROGRESS]
+        _, targets = ResultFixtureReader.load(filepath)
+        delay, rtype, rclass, rline, _ = targets['10.0.0.1'][0]
+        assert len(targets['10.0.0.1']) == 1
+        assert delay >= 0.05 and rtype == 'DATA' and rline == 'Linux\t6'
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import pytest
+
+from plugins.common.results import create_result_class, register_result_class, result_class_name, RESULT_CLASSES
+
+
+def test_roundtrip():
+    cls = create_result_class('R', ['SERVERIP', 'result1', 'result2'])
+    r = cls('a', 2)
+    assert r.to_line() == 'a\t2'
+    assert r.to_line(',') == 'a,2'
+    assert r.to_dict() == {'result1' : 'a', 'result2' : 2}
+    assert cls.to_lines([r, r]) == ['a\t2', 'a\t2']
+    assert cls.to_dicts([r]) == [r.to_dict()]
+    assert cls.from_dict(r.to_dict()).to_dict() == r.to_dict()
+    assert cls.headers == ('result1', 'result2')
+    assert not hasattr(r, '__dict__')
+
+def test_reserved_names():
+    headers = ['T', 'to_line', 'to_dict', 'headers', 'from_dict', 'class', 'self']
+    cls = create_result_class('R', headers)
+    r = cls(*range(len(headers) - 1))
+    assert r.to_dict() == {header : i for i, header in enumerate(headers[1:])}
+    assert r.to_line() == '\t'.join(str(i) for i in range(len(headers) - 1))
+    assert cls.headers == tuple(headers[1:])
+
+def test_underscore_and_colliding_fields():
+    cls = create_result_class('R', ['T', '_x', '__y', 'a b', 'a-b', 'a_b', '1st', ''])
+    r = cls(1, 2, 3, 4, 5, 6, 7)
+    assert cls.__slots__ == ('x', 'y', 'a_b', 'a_b_2', 'a_b_3', 'f_1st', 'field')
+    assert r.to_dict() == {'_x' : 1, '__y' : 2, 'a b' : 3, 'a-b' : 4, 'a_b' : 5, '1st' : 6, '' : 7}
+
+def test_duplicate_headers():
+    with pytest.raises(ValueError, match='_x'):
+        create_result_class('R', ['T', '_x', '_x'])
+
+def test_registry():
+    cls = create_result_class('RegisteredResult', ['T', 'a'])
+    assert cls.__module__ == __name__
+    assert result_class_name(cls) == __name__ + '.RegisteredResult'
+    assert RESULT_CLASSES[__name__ + '.RegisteredResult'] is cls
+    # the same class name in another plugin does not replace it
+    other = create_result_class('RegisteredResult', ['T', 'b'], module = 'plugins.other')
+    assert RESULT_CLASSES[__name__ + '.RegisteredResult'] is cls
+    assert RESULT_CLASSES['plugins.other.RegisteredResult'] is other
+    class NoFromDict:
+        pass
+    with pytest.raises(ValueError):
+        register_result_class(NoFromDict)
@@ -0,0 +1,402 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('octopwn')
+pytest.importorskip('aiosmb')
+pytest.importorskip('asysocks')
+
+from aiosmb.connection import SMBConnectionStatus
+from asysocks.unicomm.common.scanner.common import ScannerResultType, ScannerError, ScannerFinished
+from plugins.common.timing import RTTTracker
+from plugins.common.fixtures import FixtureWriter, FixtureReader
+from plugins.intermediate import smbadminmatrix
+
+
+# Fake SMB server: `credentials` authenticate, `admins` are admin. Every connection and session is logged
+# `hang` maps hosts to the number of connection attempts that never get an answer (-1 = all of them)
+# the session setup never finishes on the `stall` hosts, `rtt` is the delay of a TCP connection
+class FakeServer:
+    def __init__(self, credentials:list, admins:list, logoff_error:bool = False, hang:dict = None, stall:list = None, rtt:float = 0):
+        self.credentials = credentials
+        self.admins = admins
+        self.logoff_error = logoff_error
+        self.rtt = rtt
+        self.hang = hang if hang is not None else {}
+        self.stall = stall if stall is not None else []
+        self.connections = 0
+        self.attempts = {}
+        self.session_setups = []
+        self.share_connects = []
+        self.rpc_closed = []
+
+class FakeTarget:
+    def __init__(self, ip):
+        self.ip = ip
+
+    def get_hostname_or_ip(self):
+        return self.ip
+
+    def __str__(self):
+        return self.ip
+
+class FakeConnection:
+    def __init__(self, server:FakeServer, target):
+        self.server = server
+        self.target = target
+        self.gssapi = None
+        self.status = SMBConnectionStatus.NEGOTIATING
+        self.TreeConnectTable_id = {}
+
+    async def connect(self):
+        host = str(self.target)
+        self.server.attempts[host] = self.server.attempts.get(host, 0) + 1
+        hang = self.server.hang.get(host, 0)
+        if hang == -1 or self.server.attempts[host] <= hang:
+            await asyncio.sleep(3600)
+        if self.server.rtt > 0:
+            await asyncio.sleep(self.server.rtt)
+        self.server.connections += 1
+        return True, None
+
+    async def negotiate(self):
+        self.signing_required = False
+        self.PreauthIntegrityHashValue = b'negotiated'
+        self.status = SMBConnectionStatus.SESSIONSETUP
+        return True, None
+
+    async def session_setup(self):
+        if str(self.target) in self.server.stall:
+            await asyncio.sleep(3600)
+        self.server.session_setups.append((self.gssapi, self.status, self.PreauthIntegrityHashValue))
+        # aiosmb only puts the SessionId in the header outside of the NEGOTIATING state,
+        # without it the second message of the NTLM exchange is rejected
+        if self.status != SMBConnectionStatus.SESSIONSETUP or self.gssapi not in self.server.credentials:
+            return False, Exception('authentication failed')
+        self.status = SMBConnectionStatus.RUNNING
+        return True, None
+
+    async def tree_disconnect(self, tree_id):
+        del self.TreeConnectTable_id[tree_id]
+        return True, None
+
+    async def logoff(self):
+        if self.server.logoff_error is True:
+            return None, Exception('logoff failed')
+        return True, None
+
+    async def disconnect(self):
+        self.status = SMBConnectionStatus.CLOSED
+
+class FakeFactory:
+    def __init__(self, server:FakeServer, credential:str):
+        self.server = server
+        self.credential = credential
+
+    def create_connection_newtarget(self, target):
+        return FakeConnection(self.server, target)
+
+    def get_credential(self):
+        return self.credential
+
+class FakeShare:
+    def __init__(self, name, fullpath):
+        self.fullpath = fullpath
+
+    async def connect(self, connection):
+        connection.server.share_connects.append(self.fullpath)
+        if connection.gssapi not in connection.server.admins:
+            return None, Exception('access denied')
+        connection.TreeConnectTable_id[len(connection.TreeConnectTable_id) + 1] = self.fullpath
+        return True, None
+
+class FakeRPC:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @classmethod
+    async def from_smbconnection(cls, connection):
+        if connection.gssapi not in connection.server.admins:
+            return None, Exception('access denied')
+        return cls(connection), None
+
+    async def close(self):
+        self.connection.server.rpc_closed.append(type(self).__name__)
+
+class FakeRRPRPC(FakeRPC):
+    pass
+
+class FakeREMSVCRPC(FakeRPC):
+    pass
+
+@pytest.fixture(autouse = True)
+def fake_smb(monkeypatch):
+    monkeypatch.setattr(smbadminmatrix, 'SMBShare', FakeShare)
+    monkeypatch.setattr(smbadminmatrix, 'RRPRPC', FakeRRPRPC)
+    monkeypatch.setattr(smbadminmatrix, 'REMSVCRPC', FakeREMSVCRPC)
+
+def create_executor(server:FakeServer, cids:list, **kwargs):
+    return smbadminmatrix.SMBAdminMatrixExecutor({cid : FakeFactory(server, cid) for cid in cids}, **kwargs)
+
+async def drain(queue:asyncio.Queue):
+    results = []
+    while queue.qsize() > 0:
+        results.append(queue.get_nowait())
+    return results
+
+
+def test_credentials_share_one_connection():
+    async def run():
+        server = FakeServer(['admin', 'user'], ['admin'])
+        executor = create_executor(server, ['admin', 'user', 'wrong'])
+        queue = asyncio.Queue()
+        await executor.run(1, FakeTarget('10.0.0.1'), queue)
+        results = await drain(queue)
+        assert len(results) == 1 and results[0].type == ScannerResultType.DATA
+        entries = results[0].data.entries
+        assert {cid : entries[cid].to_status() for cid in entries} == {'admin' : 'A', 'user' : 'U', 'wrong' : 'F'}
+        assert server.connections == 1
+        # every session setup starts from the negotiated state
+        assert [x[1:] for x in server.session_setups] == [(SMBConnectionStatus.SESSIONSETUP, b'negotiated')] * 3
+        # one tree connect per credential, the RPC handles of the admin are closed
+        assert len(server.share_connects) == 2
+        assert sorted(server.rpc_closed) == ['FakeREMSVCRPC', 'FakeRRPRPC']
+    asyncio.run(run())
+
+def test_failed_logoff_renegotiates():
+    async def run():
+        server = FakeServer(['admin', 'user'], ['admin'], logoff_error = True)
+        executor = create_executor(server, ['admin', 'user'])
+        queue = asyncio.Queue()
+        await executor.run(1, FakeTarget('10.0.0.1'), queue)
+        results = await drain(queue)
+        assert results[0].data.get_admin() == ['admin']
+        assert results[0].data.get_authonly() == ['user']
+        assert server.connections == 2
+    asyncio.run(run())
+
+def test_timeouts_are_deferred_until_the_retries_are_exhausted():
+    async def run():
+        server = FakeServer(['user'], [], hang = {'10.0.0.2' : -1, '10.0.0.3' : 1})
+        executor = create_executor(server, ['user'], timing = RTTTracker(0.05, 0.01, 0.2), retries = 2)
+        queue = asyncio.Queue()
+        for i in range(1, 4):
+            await executor.run(i, FakeTarget('10.0.0.%d' % i), queue)
+        # only the responding host has a result, the others wait for the retries
+        results = await drain(queue)
+        assert [str(res.resid) for res in results] == ['10.0.0.1']
+        assert [(x[0], str(x[1]), x[2]) for x in executor.deferred] == [(2, '10.0.0.2', 1), (3, '10.0.0.3', 1)]
+
+        await asyncio.wait_for(executor.run_deferred(queue), 5)
+        results = {str(res.resid) : res for res in await drain(queue)}
+        # the host answering on the second attempt is scanned, the dead host gives up after 2 retries
+        assert results['10.0.0.3'].type == ScannerResultType.DATA
+        assert results['10.0.0.2'].type == ScannerResultType.ERROR
+        assert 'Connection timed out' in results['10.0.0.2'].data
+        assert server.attempts == {'10.0.0.1' : 1, '10.0.0.2' : 3, '10.0.0.3' : 2}
+        assert executor.deferred == []
+    asyncio.run(run())
+
+def test_retries_are_bounded_by_the_host_timeout():
+    async def run():
+        server = FakeServer(['user'], [], stall = ['10.0.0.1'])
+        executor = create_executor(server, ['user'], retries = 1, hosttimeout = 0.1)
+        executor.deferred = [(1, FakeTarget('10.0.0.1'), 1)]
+        queue = asyncio.Queue()
+        # without the host timeout the stalled session setup would hang forever
+        await asyncio.wait_for(executor.run_deferred(queue), 2)
+        results = await drain(queue)
+        assert len(results) == 1
+        assert results[0].type == ScannerResultType.ERROR
+        assert 'TimeoutError' in results[0].data
+    asyncio.run(run())
+
+def test_deferred_results_come_before_finished():
+    async def run():
+        server = FakeServer(['user'], [], hang = {'10.0.0.2' : 1})
+        executor = create_executor(server, ['user'], timing = RTTTracker(0.05, 0.01, 0.2), retries = 1)
+
+        # scanner core running the executor on two hosts, then reporting FINISHED
+        class FakeEnumerator:
+            async def scan(self):
+                queue = asyncio.Queue()
+                for i in range(1, 3):
+                    await executor.run(i, FakeTarget('10.0.0.%d' % i), queue)
+                for res in await drain(queue):
+                    yield res
+                yield ScannerFinished('SMBADMINMATRIX')
+
+        scanner = smbadminmatrix.SMBAdminMatrixScanner.__new__(smbadminmatrix.SMBAdminMatrixScanner)
+        scanner.executor = executor
+        scanner.enumerator = FakeEnumerator()
+        scanner.matrix = {}
+        scanner.recorder = None
+        processed = []
+        async def process_uniscan_result(result, h_token = None, h_clientid = None):
+            processed.append(result)
+            return None, None
+        async def do_stop(*args):
+            return True, None
+        async def fake_print(msg):
+            pass
+        scanner.process_uniscan_result = process_uniscan_result
+        scanner.do_stop = do_stop
+        scanner.print = fake_print
+        scanner.print_exc = fake_print
+
+        _, err = await scanner._SMBAdminMatrixScanner__monitor_queue()
+        assert err is None
+        assert [(res.type, str(res.resid)) for res in processed[:2]] == [
+            (ScannerResultType.DATA, '10.0.0.1'),
+            (ScannerResultType.DATA, '10.0.0.2'),
+        ]
+        assert processed[-1].type == ScannerResultType.FINISHED
+        assert sorted(scanner.matrix.keys()) == ['10.0.0.1', '10.0.0.2']
+    asyncio.run(run())
+
+async def scan_hosts(executor, hosts:list):
+    queue = asyncio.Queue()
+    for i, host in enumerate(hosts):
+        await executor.run(i, FakeTarget(host), queue)
+    await asyncio.wait_for(executor.run_deferred(queue), 5)
+    return {str(res.resid) : res.data.to_dict() if res.type == ScannerResultType.DATA else res.data for res in await drain(queue)}
+
+def test_recorded_connections_are_replayed_through_the_executor(tmp_path):
+    async def run():
+        hosts = ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+        cids = ['admin', 'user', 'wrong']
+        server = FakeServer(['admin', 'user'], ['admin'], hang = {'10.0.0.2' : 1, '10.0.0.3' : -1}, rtt = 0.01)
+        executor = create_executor(server, cids, timing = RTTTracker(0.05, 0.01, 0.2), retries = 1)
+        filepath = str(tmp_path / 'matrix.fix.gz')
+        writer = FixtureWriter(filepath, smbadminmatrix.FIXTURE_KIND, credentials = cids, workers = 1, hosttimeout = None)
+        executor.connection_factory = smbadminmatrix.recording_connection_factory(executor.factories, writer)
+        live = await scan_hosts(executor, hosts)
+        writer.close()
+        assert live['10.0.0.1']['admin'] == ['admin'] and live['10.0.0.2']['failed'] == ['wrong']
+        assert 'Connection timed out' in live['10.0.0.3']
+        connections = server.connections
+
+        header, records = FixtureReader.load(filepath, smbadminmatrix.FIXTURE_KIND)
+        assert header['credentials'] == cids
+        targets = FixtureReader.group(records)
+        assert list(targets.keys()) == hosts
+
+        # same executor settings: the same results without touching the server,
+        # the host answering on the second attempt is deferred and retried again
+        replay = smbadminmatrix.SMBAdminMatrixExecutor(
+            {cid : None for cid in cids},
+            RTTTracker(0.05, 0.01, 0.2),
+            retries = 1,
+            connection_factory = smbadminmatrix.replay_connection_factory(targets),
+        )
+        assert await scan_hosts(replay, hosts) == live
+        assert server.connections == connections
+
+        # the executor runs for real: without retries the hosts that timed out give up right away
+        replay = smbadminmatrix.SMBAdminMatrixExecutor(
+            {cid : None for cid in cids},
+            RTTTracker(0.05, 0.01, 0.2),
+            connection_factory = smbadminmatrix.replay_connection_factory(targets, speed = 0),
+        )
+        results = await scan_hosts(replay, hosts)
+        assert results['10.0.0.1'] == live['10.0.0.1']
+        assert 'Connection timed out' in results['10.0.0.2']
+        assert 'Connection timed out' in results['10.0.0.3']
+    asyncio.run(run())
+
+def test_replayed_failed_logoff_renegotiates(tmp_path):
+    async def run():
+        server = FakeServer(['admin', 'user'], ['admin'], logoff_error = True)
+        executor = create_executor(server, ['admin', 'user'])
+        filepath = str(tmp_path / 'matrix.fix.gz')
+        writer = FixtureWriter(filepath, smbadminmatrix.FIXTURE_KIND, credentials = ['admin', 'user'], workers = 1, hosttimeout = None)
+        executor.connection_factory = smbadminmatrix.recording_connection_factory(executor.factories, writer)
+        live = await scan_hosts(executor, ['10.0.0.1'])
+        writer.close()
+
+        _, records = FixtureReader.load(filepath)
+        # the recorded disconnect closes the replayed connection, so the executor negotiates again
+        assert [record[1] for record in records].count('connect') == 2
+        created = []
+        factory = smbadminmatrix.replay_connection_factory(FixtureReader.group(records), speed = 0)
+        def create_connection(target):
+            created.append(str(target))
+            return factory(target)
+        replay = smbadminmatrix.SMBAdminMatrixExecutor({'admin' : None, 'user' : None}, connection_factory = create_connection)
+        assert await scan_hosts(replay, ['10.0.0.1']) == live
+        assert created == ['10.0.0.1', '10.0.0.1']
+    asyncio.run(run())
+
+class FakeParams:
+    def __init__(self, values:dict):
+        self.values = values
+
+    def getvalue(self, name):
+        return self.values[name]
+
+    def setvalue(self, name, value):
+        self.values[name] = value
+
+def test_replay_runs_through_the_scanner_core(tmp_path):
+    async def run():
+        server = FakeServer(['admin'], ['admin'])
+        executor = create_executor(server, ['admin'])
+        filepath = str(tmp_path / 'matrix.fix.gz')
+        writer = FixtureWriter(filepath, smbadminmatrix.FIXTURE_KIND, credentials = ['admin'], workers = 2, hosttimeout = 5)
+        executor.connection_factory = smbadminmatrix.recording_connection_factory(executor.factories, writer)
+        await scan_hosts(executor, ['10.0.0.1', '10.0.0.2'])
+        writer.close()
+
+        scanner = smbadminmatrix.SMBAdminMatrixScanner.__new__(smbadminmatrix.SMBAdminMatrixScanner)
+        scanner.params = FakeParams({'replayfile' : filepath, 'replayspeed' : '0', 'replaylatency' : 0})
+        async def fake_print(msg):
+            pass
+        scanner.print = fake_print
+        create_replay = scanner._SMBAdminMatrixScanner__create_replay
+        with pytest.raises(Exception, match='not recorded'):
+            await create_replay(['admin', 'other'], smbadminmatrix.SMBAdminMatrixExecutor)
+
+        replay, enumerator = await create_replay(['admin'], smbadminmatrix.SMBAdminMatrixExecutor)
+        # the scanner core settings of the recording are used
+        assert enumerator.worker_count == 2 and enumerator.host_timeout == 5
+        results = [res async for res in enumerator.scan() if res.type == ScannerResultType.DATA]
+        assert sorted([(str(res.resid), res.data.get_admin()) for res in results]) == [('10.0.0.1', ['admin']), ('10.0.0.2', ['admin'])]
+        assert server.connections == 2
+    asyncio.run(run())
+
+
+# Benchmark: a sweep over 100 hosts with 5 workers, 10 of the hosts never answer. The workers apply
+# the host timeout like the scanner core does. With a fixed timeout every dead host holds a worker for
+# the full host timeout, with the adaptive timeout only for a few RTTs. The times are scaled down
+# (RTT 10ms, host timeout 0.5s) to keep the test fast.
+async def sweep(executor, hosttimeout:float, workers:int = 5):
+    targets = asyncio.Queue()
+    for i in range(100):
+        targets.put_nowait((i, FakeTarget('10.0.%d.%d' % (i // 10, i % 10))))
+    queue = asyncio.Queue()
+
+    async def worker():
+        while targets.empty() is False:
+            targetid, target = targets.get_nowait()
+            try:
+                await asyncio.wait_for(executor.run(targetid, target, queue), hosttimeout)
+            except asyncio.TimeoutError as e:
+                await queue.put(ScannerError(target, e))
+
+    start = time.monotonic()
+    await asyncio.gather(*[worker() for _ in range(workers)])
+    await executor.run_deferred(queue)
+    results = await drain(queue)
+    return time.monotonic() - start, len([res for res in results if res.type == ScannerResultType.DATA])
+
+def test_adaptive_sweep_benchmark():
+    async def run():
+        dead = {'10.0.%d.5' % i : -1 for i in range(10)}
+        fixed, fixed_alive = await sweep(create_executor(FakeServer(['user'], [], hang = dead, rtt = 0.01), ['user']), 0.5)
+        executor = create_executor(FakeServer(['user'], [], hang = dead, rtt = 0.01), ['user'], timing = RTTTracker(0.5, 0.05, 0.5), retries = 1, retryworkers = 10, hosttimeout = 0.5)
+        adaptive, adaptive_alive = await sweep(executor, 0.5)
+        # no responding host is lost to the shorter timeouts, the dead hosts are retried once in parallel
+        assert fixed_alive == adaptive_alive == 90
+        assert adaptive < fixed / 2
+    asyncio.run(run())
@@ -0,0 +1,17 @@
+from plugins.common.timing import RTTTracker
+
+
+def test_timeout_from_rtt():
+    tracker = RTTTracker(3, 0.5, 10)
+    assert tracker.get_timeout('a') == 3
+    tracker.update('a', 1.0)
+    # srtt + 4 * rttvar, with rttvar = rtt / 2 after the first sample
+    assert tracker.get_timeout('a') == 3.0
+    # hosts without samples use the network-wide estimate
+    assert tracker.get_timeout('b') == 3.0
+    # doubled for each retry, clamped to the maximum
+    assert tracker.get_timeout('a', 1) == 6.0
+    assert tracker.get_timeout('a', 2) == 10
+    for _ in range(50):
+        tracker.update('a', 0.01)
+    assert tracker.get_timeout('a') == 0.5
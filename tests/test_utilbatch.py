@@ -0,0 +1,106 @@
+import asyncio
+
+from plugins.common.utilbatch import UtilBatchMixin
+
+
+# Minimal session with the attributes of ScannerConsoleBase the mixin relies on
+class FakeUtil(UtilBatchMixin):
+    batch_api_commands = {'echo' : 'echo_api'}
+
+    def __init__(self, login_ok:bool = True, nologon_commands:list = None):
+        self.login_ok = login_ok
+        self.nologon_commands = nologon_commands if nologon_commands is not None else []
+        self.printed = []
+        self.running = 0
+        self.max_running = 0
+
+    async def print(self, msg):
+        self.printed.append(msg)
+
+    async def print_exc(self, e):
+        self.printed.append(e)
+
+    async def echo_api(self, *args):
+        return list(args), None
+
+    async def do_echo(self, *args):
+        raise Exception('the printing variant must not be used in batch mode')
+
+    async def do_sleep(self, delay:str):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(float(delay))
+        self.running -= 1
+        return delay, None
+
+    async def do_fail(self):
+        return None, Exception('failed')
+
+    async def do_raise(self):
+        raise Exception('raised')
+
+
+def test_argument_splitting():
+    util = FakeUtil()
+    func, args = util.resolve_batch_command('echo NORTH\\hodor hodor \\\\dc\\c$ "a b" \'c d\'')
+    assert func == util.echo_api
+    assert args == ['NORTH\\hodor', 'hodor', '\\\\dc\\c$', 'a b', 'c d']
+
+def test_order_and_concurrency():
+    async def run():
+        util = FakeUtil()
+        commands = ['sleep %s' % (0.05 - i * 0.01) for i in range(5)]
+        results, err = await util.batch(commands, concurrency = 3)
+        assert err is None
+        assert [res['command'] for res in results] == commands
+        assert [res['result'] for res in results] == ['%s' % (0.05 - i * 0.01) for i in range(5)]
+        assert util.max_running == 3
+    asyncio.run(run())
+
+def test_async_iterator_input():
+    async def run():
+        async def commands():
+            for i in range(3):
+                yield 'echo %d' % i
+        results, err = await FakeUtil().batch(commands())
+        assert err is None
+        assert [res['result'] for res in results] == [['0'], ['1'], ['2']]
+    asyncio.run(run())
+
+def test_errors_are_per_command():
+    async def run():
+        util = FakeUtil()
+        results, err = await util.batch(['echo a', 'fail', 'raise', 'batch x.txt', 'nosuchcmd', 'echo b'])
+        assert err is None
+        assert [res['error'] for res in results] == [
+            None,
+            'failed',
+            'raised',
+            'Command "batch" is not allowed in batch mode',
+            'Unknown command "nosuchcmd"',
+            None,
+        ]
+        assert results[-1]['result'] == ['b']
+    asyncio.run(run())
+
+def test_login_check():
+    async def run():
+        results, _ = await FakeUtil(login_ok = False).batch(['echo a'])
+        assert results[0]['error'] == 'Command "echo" requires login'
+        results, _ = await FakeUtil(login_ok = False, nologon_commands = ['echo']).batch(['echo a', 'fail'])
+        assert results[0]['error'] is None
+        assert results[1]['error'] == 'Command "fail" requires login'
+        results, _ = await FakeUtil(login_ok = False, nologon_commands = ['any']).batch(['echo a'])
+        assert results[0]['error'] is None
+    asyncio.run(run())
+
+def test_do_batch_script(tmp_path):
+    async def run():
+        script = tmp_path / 'script.txt'
+        script.write_text('# comment\n\necho a\nfail\n')
+        util = FakeUtil()
+        results, err = await util.do_batch(str(script))
+        assert err is None
+        assert len(results) == 2
+        assert util.printed == ['[-] fail -> failed', '[+] Batch finished: 2 commands, 1 failed']
+    asyncio.run(run())